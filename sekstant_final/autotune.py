@@ -0,0 +1,273 @@
+import argparse
+import math
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from pid import PID
+from stream_filters import EMA
+
+# Pins and the DIR level that counts as a positive (corrective) output, as in the trackers:
+# tracker_angle.py queues corrections with CCW = 0, longetude.py sets rates with CCW = 1
+DIR1, STEP1, DIR2, STEP2 = 20, 21, 8, 7
+POSITIVE_DIR = {'steps': 0, 'velocity': 1}
+STEP_DELAY = 0.005
+MAX_ACCEL = 400
+
+CONTROL_HZ = 20
+ALPHA = 0.1
+# Output limits the trackers use, and the test amplitudes in the same units
+LIMIT = {'steps': 50, 'velocity': 100}
+STEP_TEST = {'steps': 10, 'velocity': 100}    # Applied for STEP_TEST_S, about 100 steps either way
+RELAY = {'steps': 5, 'velocity': 50}
+STEP_TEST_S = 1.0
+SETTLE_S = 3.0
+RELAY_CYCLES = 6           # Full oscillations measured, after RELAY_SKIP discarded half-cycles
+RELAY_SKIP = 3
+RELAY_TIMEOUT_S = 120.0
+MIN_RESPONSE = 10          # LDR counts the step test must move the difference by
+VERIFY_S = 30.0
+VERIFY_BAND = 0.1          # Settled within this fraction of the knock-off error
+VERIFY_HOLD_S = 5.0        # ... held for this long, or one Tu if longer, before VERIFY_S runs out
+MAX_OVERSHOOT = 0.3
+BACKOFF = 0.5              # Gain scale applied after a failed verification
+VERIFY_ATTEMPTS = 3
+
+# kp = a * Ku, Ti = b * Tu, Td = c * Tu
+RULES = {
+    'tyreus-luyben': (1 / 3.2, 2.2, 0.0),
+    'ziegler-nichols': (0.45, 1 / 1.2, 0.0),
+    'no-overshoot-pid': (0.2, 0.5, 1 / 3),
+}
+
+
+class HardwareLoop:
+    """
+    LDR differences and axis output on the real (or --sim) hardware.
+
+    A reader thread decodes and smooths every sample as it arrives;
+    samples() hands out the newest smoothed pair CONTROL_HZ times a second.
+    """
+
+    def __init__(self, mode, alpha=ALPHA):
+        import hardware
+        from motion_worker import AxisWorker
+        from serial_reader import SerialReader
+        from ldr_protocol import LDRDecoder
+        self.mode = mode
+        self.latest = None
+        ser = hardware.serial_port()
+        if ser is None:
+            raise RuntimeError('no LDR serial port')
+        stepper = hardware.stepper()
+        profile = hardware.unit_profile()
+        # Step periods and ramps capped by the measured limits, exactly as the trackers run them
+        if mode == 'steps':
+            self.axes = [AxisWorker(stepper, DIR1, STEP1, profile.step_delay(1, STEP_DELAY)),
+                         AxisWorker(stepper, DIR2, STEP2, profile.step_delay(2, STEP_DELAY))]
+        else:
+            self.axes = [stepper.queue_velocity(dir_pin, step_pin,
+                                                min(MAX_ACCEL, profile.motion(axis, max_accel=MAX_ACCEL)['max_accel']),
+                                                positive=POSITIVE_DIR[mode])
+                         for axis, dir_pin, step_pin in ((1, DIR1, STEP1), (2, DIR2, STEP2))]
+        self.reader = SerialReader(ser)
+        self.decoder = LDRDecoder()
+        self.smoothing = EMA(alpha)
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for chunk in self.reader.chunks():
+            values = self.decoder.feed(chunk) if chunk is not None else ()
+            if len(values):
+                smoothed = self.smoothing.update_batch(values)[-1]
+                self.latest = [smoothed[0] - smoothed[1], smoothed[2] - smoothed[3]]
+
+    def samples(self):
+        tick = time.monotonic()
+        while True:
+            tick += 1 / CONTROL_HZ
+            time.sleep(max(0.0, tick - time.monotonic()))
+            if self.latest is not None:
+                yield time.monotonic(), list(self.latest)
+
+    def command(self, k, output):
+        if self.mode == 'steps':
+            positive = POSITIVE_DIR['steps']
+            self.axes[k].submit(positive if output >= 0 else 1 - positive, int(output))
+        else:
+            self.axes[k].set_rate(output)
+
+    def close(self):
+        for k in range(2):
+            self.command(k, 0)
+        self.reader.close()
+
+
+class SimLoop:
+    """ The same interface on the offline tracker_sim plant, in simulated time. """
+
+    def __init__(self, mode, alpha=ALPHA, **params):
+        import tracker_sim
+        self.plant = tracker_sim.Plant(tracker_sim.settings(dict(params, mode=mode, duration=3600.0)))
+        self.smoothing = [EMA(alpha, initial=0.0) for _ in range(2)]
+        self.now = 0.0
+
+    def samples(self):
+        tick = 0.0
+        while self.plant.remaining():
+            self.now, reading, _ = self.plant.next_delivery()
+            smoothed = [self.smoothing[k].update(reading[k]) for k in range(2)]
+            if self.now >= tick:
+                tick = self.now + 1 / CONTROL_HZ
+                yield self.now, smoothed
+
+    def command(self, k, output):
+        self.plant.command(k, output, self.now)
+
+    def close(self):
+        pass
+
+
+def hold(loop, k, output, seconds):
+    """ Apply a fixed output to axis k; returns the axis' smoothed differences meanwhile. """
+    values, start = [], None
+    for now, pair in loop.samples():
+        start = now if start is None else start
+        loop.command(k, output)
+        values.append(pair[k])
+        if now - start >= seconds:
+            return np.array(values)
+
+
+def step_test(loop, k, mode):
+    """
+    Which way a positive output moves the LDR difference, and the noise on it.
+
+    Returns (sign, noise): sign is +1 when positive output reduces the
+    difference, as the trackers assume.
+    """
+    baseline = hold(loop, k, 0, SETTLE_S)
+    noise = float(np.std(baseline[len(baseline) // 2:]))
+    before = float(np.mean(baseline[-5:]))
+    hold(loop, k, STEP_TEST[mode], STEP_TEST_S)
+    after = float(np.mean(hold(loop, k, 0, SETTLE_S / 2)[-5:]))
+    if abs(after - before) < max(MIN_RESPONSE, 3 * noise):
+        raise RuntimeError(f'axis {k + 1}: no LDR response to the step test; is the light source in view?')
+    return (1 if after < before else -1), noise
+
+
+def relay_test(loop, k, mode, sign, noise):
+    """
+    Relay feedback on axis k: the output switches between +-h as the
+    difference crosses zero (with hysteresis above the noise). Returns the
+    ultimate gain Ku and period Tu from the resulting oscillation.
+    """
+    h = RELAY[mode]
+    eps = max(3 * noise, 1.0)
+    output, switches, times, values = sign * h, [], [], []
+    start = None
+    for now, pair in loop.samples():
+        start = now if start is None else start
+        e = pair[k]
+        times.append(now)
+        values.append(e)
+        if output * sign > 0 and e < -eps or output * sign < 0 and e > eps:
+            output = -output
+            switches.append(now)
+            if len(switches) >= RELAY_SKIP + 2 * RELAY_CYCLES + 1:
+                break
+        loop.command(k, output)
+        if now - start > RELAY_TIMEOUT_S:
+            loop.command(k, 0)
+            raise RuntimeError(f'axis {k + 1}: relay test did not oscillate within {RELAY_TIMEOUT_S:.0f} s')
+    loop.command(k, 0)
+    times, values = np.array(times), np.array(values)
+    cycles = list(zip(switches[RELAY_SKIP:-2:2], switches[RELAY_SKIP + 2::2]))
+    tu = float(np.mean([end - begin for begin, end in cycles]))
+    a = float(np.mean([np.ptp(values[(times >= begin) & (times < end)]) / 2 for begin, end in cycles]))
+    # Describing function of a relay with hysteresis eps
+    ku = 4 * h / (math.pi * math.sqrt(max(a * a - eps * eps, 1e-9)))
+    return ku, tu
+
+
+def gains_from_relay(ku, tu, rule, mode):
+    a, b, c = RULES[rule]
+    kp = a * ku
+    return {'kp': kp, 'ki': kp / (b * tu), 'kd': kp * c * tu, 'limit': LIMIT[mode]}
+
+
+def verify(loop, k, mode, gains, noise, tu):
+    """ Knock the axis off target, close the loop with `gains` and report how it settles. """
+    hold(loop, k, -STEP_TEST[mode], 2 * STEP_TEST_S)
+    pid = PID(gains['kp'], gains['ki'], gains['kd'], dt=1 / CONTROL_HZ, limit=gains['limit'],
+              settle_band=VERIFY_BAND, settle_hold=max(tu, VERIFY_HOLD_S), noise=3 * noise)
+    start = None
+    for now, pair in loop.samples():
+        start = now if start is None else start
+        loop.command(k, pid.update(pair[k], now))
+        if now - start >= VERIFY_S:
+            break
+    loop.command(k, 0)
+    stats = pid.stats()
+    stats['passed'] = stats['settling_time'] is not None and stats['overshoot'] <= MAX_OVERSHOOT
+    return stats
+
+
+def tune_axis(loop, k, mode, rule):
+    """ Step test, relay test, gains, then verification with back-off; returns the profile entry. """
+    sign, noise = step_test(loop, k, mode)
+    if sign < 0:
+        raise RuntimeError(f'axis {k + 1}: positive output moves away from the light; the tracker would run away '
+                           f'on this axis, check its DIR wiring')
+    ku, tu = relay_test(loop, k, mode, sign, noise)
+    gains = gains_from_relay(ku, tu, rule, mode)
+    print(f"axis {k + 1}: Ku {ku:.4g}, Tu {tu:.2f} s -> kp {gains['kp']:.4g}, ki {gains['ki']:.4g}, kd {gains['kd']:.4g}")
+    for attempt in range(VERIFY_ATTEMPTS):
+        result = verify(loop, k, mode, gains, noise, tu)
+        settled = f"{result['settling_time']:.1f} s" if result['settling_time'] is not None else 'no'
+        print(f"axis {k + 1}: verify {attempt + 1}: settled {settled}, overshoot {result['overshoot'] * 100:.0f}%")
+        if result['passed']:
+            return dict(gains, ku=ku, tu=tu, rule=rule, noise=noise, settling_time=result['settling_time'],
+                        overshoot=result['overshoot'], tuned=time.strftime('%Y-%m-%d %H:%M'))
+        gains = dict(gains, kp=gains['kp'] * BACKOFF, ki=gains['ki'] * BACKOFF, kd=gains['kd'] * BACKOFF)
+    raise RuntimeError(f'axis {k + 1}: no stable gains after {VERIFY_ATTEMPTS} attempts')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Identify each tracking axis with a relay test and store tuned gains '
+                                                 'in the unit profile.')
+    parser.add_argument('--mode', choices=sorted(POSITIVE_DIR), default='steps',
+                        help='steps: tracker_angle and the simple trackers; velocity: longetude')
+    parser.add_argument('--rule', choices=sorted(RULES), default='tyreus-luyben')
+    parser.add_argument('--axis', type=int, choices=(1, 2), nargs='+', default=[1, 2])
+    parser.add_argument('--offline', action='store_true', help='tune against the tracker_sim plant model')
+    parser.add_argument('--dry-run', action='store_true', help='do not write the profile')
+    parser.add_argument('--sim', action='store_true', help='use the simulated hardware')
+    args = parser.parse_args()
+
+    loop = SimLoop(args.mode) if args.offline else HardwareLoop(args.mode)
+    tuned = {}
+    try:
+        for axis in args.axis:
+            try:
+                tuned[axis] = tune_axis(loop, axis - 1, args.mode, args.rule)
+            except RuntimeError as e:
+                print(e)
+    finally:
+        loop.close()
+    if not tuned or args.dry_run or args.offline:
+        return
+    import hardware
+    profile = hardware.unit_profile()
+    for axis, entry in tuned.items():
+        profile.set_gains(args.mode, axis, entry)
+    profile.save()
+    print(f"Saved {args.mode} gains for axis {', '.join(map(str, tuned))} to {profile.path}")
+
+
+if __name__ == '__main__':
+    main()
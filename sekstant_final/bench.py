@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+# The benchmarks always run against the simulated hardware layer
+os.environ['SEKSTANT_SIM'] = '1'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import hardware
+from stepper_wave import constant_intervals, WaveStepper, GPIOStepper
+from serial_reader import SerialReader
+from ldr_protocol import encode_frame, LDRDecoder
+from stream_filters import EMA
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+TOLERANCE = 0.2  # Relative change allowed before a metric counts as a regression
+MIN_DELTA = 1.0  # Latency changes below one unit (us or ms) are noise, whatever the ratio
+
+DIR1, STEP1 = 20, 21
+
+# EMA.update_batch must match update() sample by sample at these alphas, down to rounding
+EMA_CHECK_ALPHAS = (0.1, 0.9, 0.999, 1.0)
+EMA_CHECK_TOLERANCE = 1e-9
+
+# Metrics where a larger value is better; everything else is a latency/cost
+HIGHER_IS_BETTER = ('rate', 'per_s', 'fps')
+
+
+def percentiles(values, scale=1.0):
+    values = np.asarray(values, dtype=float) * scale
+    if not len(values):
+        return {'p50': None, 'p99': None, 'max': None}
+    return {'p50': float(np.percentile(values, 50)), 'p99': float(np.percentile(values, 99)),
+            'max': float(values.max())}
+
+
+def edges_since(step_pin, start):
+    times = np.fromiter(hardware.sim.bank.pulses.get(step_pin, ()), dtype=float)
+    return times[times >= start]
+
+
+def bench_step_rate(stepper, steps=2000, delay=0.00025):
+    """ Achieved step frequency and interval jitter for one constant-speed move. """
+    start = time.monotonic()
+    move = stepper.queue_move(DIR1, STEP1, 1, constant_intervals(steps, delay))
+    move.wait()
+    edges = edges_since(STEP1, start)
+    nominal_us = 2 * delay * 1e6
+    jitter = np.abs(np.diff(edges) * 1e6 - nominal_us)
+    return {'target_rate': 1 / (2 * delay), 'achieved_rate': move.rate,
+            'steps': move.steps, 'jitter_us': percentiles(jitter)}
+
+
+def bench_abort_latency(stepper, runs=20, delay=0.00025):
+    """ abort_event set -> last step edge / move finished, through MotorController's polling loop. """
+    stop_edge, stop_done = [], []
+    for i in range(runs):
+        abort_event = threading.Event()
+        move = stepper.queue_move(DIR1, STEP1, 1, constant_intervals(None, delay))
+
+        def run_motor():
+            while not move.wait(0.01):
+                if abort_event.is_set():
+                    stepper.stop(STEP1)
+
+        thread = threading.Thread(target=run_motor)
+        thread.start()
+        time.sleep(0.05 + 0.005 * (i % 10))
+        aborted = time.monotonic()
+        abort_event.set()
+        thread.join()
+        stop_done.append(time.monotonic() - aborted)
+        time.sleep(0.05)
+        edges = edges_since(STEP1, aborted)
+        stop_edge.append(edges[-1] - aborted if len(edges) else 0.0)
+    return {'to_last_edge_ms': percentiles(stop_edge, 1e3), 'to_done_ms': percentiles(stop_done, 1e3)}
+
+
+def bench_imu(duration=1.0):
+    """ getMotion6 call cost and the sample rate a tight loop reaches. """
+    sensor = hardware.imu()
+    latencies = []
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        t = time.perf_counter()
+        sensor.getMotion6()
+        latencies.append(time.perf_counter() - t)
+    return {'sample_rate': len(latencies) / duration, 'call_us': percentiles(latencies, 1e6)}
+
+
+def parse_ldr_line(line, smooth, alpha=0.1):
+    # Same work ldr_thread does per line
+    ldr_values = line.decode('utf-8').strip().split(',')
+    if len(ldr_values) == 4:
+        smooth = [s * (1 - alpha) + int(v) * alpha for s, v in zip(smooth, ldr_values)]
+    return smooth
+
+
+def bench_serial(lines=20000, duration=1.0, chunk=256, control_s=0.005):
+    """
+    Text and binary decode throughput, then a 1 kHz simulated LDR stream
+    consumed by a controller slower than the stream: backlog per control
+    cycle, input-to-actuation latency, reader wakeups and CPU.
+    """
+    sample = [b'2006,1989,2048,1935\r\n'] * lines
+    smooth = [0.0] * 4
+    t = time.perf_counter()
+    for line in sample:
+        smooth = parse_ldr_line(line, smooth)
+    parse_rate = lines / (time.perf_counter() - t)
+
+    stream = b''.join(encode_frame(i, (2006, 1989, 2048, 1935)) for i in range(lines))
+    decoder = LDRDecoder()
+    t = time.perf_counter()
+    for i in range(0, len(stream), chunk):
+        decoder.feed(stream[i:i + chunk])
+    decode_rate = decoder.frames / (time.perf_counter() - t)
+
+    ser = hardware.sim.LDRSerial(timeout=1, rate_hz=1000)
+    reader = SerialReader(ser)
+    decoder = LDRDecoder()
+    smoothing = EMA(0.1, initial=np.zeros(4))
+    cycles = 0
+    end = time.monotonic() + duration
+    for data in reader.chunks():
+        values = decoder.feed(data) if data is not None else ()
+        if len(values):
+            smoothing.update_batch(values)
+            time.sleep(control_s)  # Stand-in for the control law and motor hand-off
+            reader.actuated()
+            cycles += 1
+        if time.monotonic() >= end:
+            break
+    stats = reader.stats()
+    ser.close()
+    return {'parse_lines_per_s': parse_rate, 'decode_frames_per_s': decode_rate,
+            'read_frames_per_s': decoder.frames / duration,
+            'wakeups_per_frame': stats['wakeups'] / max(decoder.frames, 1),
+            'frames_per_cycle': decoder.frames / max(cycles, 1),
+            'latency_ms': stats['latency_ms_p50'], 'latency_max_ms': stats['latency_ms_max'],
+            'reader_cpu_fraction': stats['cpu_time'] / duration, 'frames_lost': decoder.lost}
+
+
+def bench_camera(frames=60):
+    """ Frame time of the update_frame path (capture + colour conversion). """
+    try:
+        cv2 = hardware.lazy_import('cv2')
+    except ImportError:
+        return {'skipped': 'cv2 not installed'}
+    capture = hardware.sim.Camera(0)
+    frame_times = []
+    for _ in range(frames):
+        t = time.perf_counter()
+        ret, frame = capture.read()
+        if ret:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame_times.append(time.perf_counter() - t)
+    capture.release()
+    return {'fps': frames / sum(frame_times), 'frame_ms': percentiles(frame_times, 1e3)}
+
+
+def check_ema(samples=1000):
+    """ Largest relative difference between EMA.update_batch and update() per alpha (inf if not finite). """
+    rng = np.random.default_rng(0)
+    errors = {}
+    for alpha in EMA_CHECK_ALPHAS:
+        xs = rng.normal(2000, 50, (samples, 4))
+        batch, scalar = EMA(alpha), EMA(alpha)
+        # Two uneven batches, so the state carried between calls is checked too
+        out = np.concatenate([batch.update_batch(xs[:samples * 2 // 3]), batch.update_batch(xs[samples * 2 // 3:])])
+        expected = np.array([scalar.update(x) for x in xs])
+        error = np.abs(out - expected) / np.abs(expected)
+        errors[f'alpha_{alpha:g}'] = float(error.max()) if np.isfinite(out).all() else float('inf')
+    return errors
+
+
+def check_ldr_sync(frames=50):
+    """ LDRDecoder cases that lose readings: reads starting mid-frame or mid-line, and a reset between them. """
+    values = (2006, 1989, 2048, 1935)
+    binary = b''.join(encode_frame(i, values) for i in range(10, 10 + frames))
+    text = b'2006,1989,2048,1935\r\n' * frames
+    # Cut after the sync word, so the first read holds seq 10 (a 0x0A byte) and no SYNC; text is cut mid-line.
+    # Cases are (fed before a reset, stream, readings expected from the stream in 7-byte reads)
+    cases = {'binary_mid_frame': (b'', binary[2:], frames - 1), 'text_mid_line': (b'', text[5:], frames - 1),
+             'binary_after_reset': (text, binary[2:], frames - 1)}
+    failures = []
+    for name, (before, stream, expected) in cases.items():
+        decoder = LDRDecoder()
+        decoder.feed(before)
+        decoder.reset()
+        got = sum(len(decoder.feed(stream[i:i + 7])) for i in range(0, len(stream), 7))
+        if got != expected:
+            failures.append(f'{name}: {got} of {expected} readings')
+    return failures
+
+
+def run_all():
+    pi = hardware.pi()
+    wave = WaveStepper(pi)
+    gpio = GPIOStepper()
+    results = {
+        'step_rate_wave': bench_step_rate(wave),
+        'step_rate_gpio': bench_step_rate(gpio),
+        'abort_wave': bench_abort_latency(wave),
+        'abort_gpio': bench_abort_latency(gpio),
+        'imu': bench_imu(),
+        'serial': bench_serial(),
+        'camera': bench_camera(),
+    }
+    wave.close()
+    return results
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """ Metrics that got worse than the baseline by more than `tolerance`. """
+    regressions = []
+    current = flatten(results)
+    for name, old in flatten(baseline).items():
+        new = current.get(name)
+        if new is None or not old or name.endswith('.max') or name.endswith('steps'):
+            continue
+        higher_better = any(tag in name for tag in HIGHER_IS_BETTER)
+        change = (new - old) / abs(old)
+        if not higher_better and new - old < MIN_DELTA:
+            continue
+        if (higher_better and change < -tolerance) or (not higher_better and change > tolerance):
+            regressions.append({'metric': name, 'baseline': old, 'current': new, 'change': change})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark stepping, tracking and capture paths on simulated hardware.')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = {'results': run_all()}
+    ema = check_ema()
+    report['ema_batch_mismatches'] = [name for name, error in ema.items() if not error <= EMA_CHECK_TOLERANCE]
+    report['ldr_sync_failures'] = check_ldr_sync()
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report['results'], f, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            report['regressions'] = compare(report['results'], json.load(f), args.tolerance)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    hardware.shutdown()
+    return 1 if report.get('regressions') or report['ema_batch_mismatches'] or report['ldr_sync_failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import functools
+import time
+
+import numpy as np
+
+# Low-precision solar coordinates (Astronomical Almanac), good to about 0.01 degrees for 1950-2050
+J2000 = 2451545.0
+UNIX_EPOCH_JD = 2440587.5
+RATE_STEP_S = 60.0   # Rates are the mean over the minute containing the requested time
+
+
+def _sun(t):
+    """ Right ascension, declination and Greenwich mean sidereal time (radians) at UTC epoch seconds t. """
+    d = np.asarray(t, dtype=float) / 86400.0 + UNIX_EPOCH_JD - J2000
+    g = np.radians(357.529 + 0.98560028 * d)
+    q = 280.459 + 0.98564736 * d
+    ecliptic = np.radians(q + 1.915 * np.sin(g) + 0.020 * np.sin(2 * g))
+    obliquity = np.radians(23.439 - 0.00000036 * d)
+    ra = np.arctan2(np.cos(obliquity) * np.sin(ecliptic), np.cos(ecliptic))
+    dec = np.arcsin(np.sin(obliquity) * np.sin(ecliptic))
+    gmst = np.radians(280.46061837 + 360.98564736629 * d)
+    return ra, dec, gmst
+
+
+def sun_position(t, latitude, longitude):
+    """
+    Sun altitude and azimuth in degrees for UTC epoch seconds `t` (scalar or
+    array), at latitude/longitude in degrees (east positive). Azimuth is
+    measured from north through east; refraction is ignored.
+    """
+    ra, dec, gmst = _sun(t)
+    ha = gmst + np.radians(longitude) - ra
+    lat = np.radians(latitude)
+    alt = np.arcsin(np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(ha))
+    az = np.arctan2(-np.sin(ha), np.tan(dec) * np.cos(lat) - np.sin(lat) * np.cos(ha))
+    return np.degrees(alt), np.degrees(az) % 360
+
+
+def equation_of_time(t):
+    """ Apparent minus mean solar time, in minutes, at UTC epoch seconds t (scalar or array). """
+    ra, _, gmst = _sun(t)
+    utc_hours = np.asarray(t, dtype=float) % 86400.0 / 3600.0
+    # Hour angle of the true sun minus that of the mean sun; the longitude cancels
+    difference = np.degrees(gmst - ra) - (utc_hours - 12) * 15
+    return ((difference + 180) % 360 - 180) * 4
+
+
+def transit_longitude(t):
+    """ Longitude (degrees, east positive) where the sun crosses the meridian at UTC epoch seconds t. """
+    noon_utc = np.asarray(t, dtype=float) % 86400.0 / 3600.0
+    longitude = (12 - noon_utc) * 15 - equation_of_time(t) / 4
+    return (longitude + 180) % 360 - 180
+
+
+@functools.lru_cache(maxsize=16)
+def _minute_rates(minute, latitude, longitude):
+    alt, az = sun_position(np.array([minute, minute + 1]) * RATE_STEP_S, latitude, longitude)
+    # Azimuth wraps through north; take the short way round
+    turn = (az[1] - az[0] + 180) % 360 - 180
+    return float(alt[1] - alt[0]) / RATE_STEP_S, float(turn) / RATE_STEP_S
+
+
+def sun_rate(latitude, longitude, t=None):
+    """ (altitude, azimuth) rate of the sun in degrees per second at UTC epoch seconds t (default now). """
+    t = time.time() if t is None else t
+    return _minute_rates(int(t // RATE_STEP_S), round(latitude, 2), round(longitude, 2))
+
+
+def zone_longitude():
+    """ Rough longitude from the local time zone, for use until a transit has been measured. """
+    offset = time.altzone if time.localtime().tm_isdst > 0 else time.timezone
+    return -offset / 240.0
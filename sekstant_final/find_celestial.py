@@ -1,63 +1,69 @@
 import sys
 import threading
+import hardware
 from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout, QPushButton, QLineEdit, QFrame
 from PyQt5.QtGui import QImage, QPixmap, QDoubleValidator
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QObject
-import RPi.GPIO as GPIO
-from time import sleep
-import cv2
-import pigpio
+from startup_metrics import mark
 
-# Connect to pigpio
-pi = pigpio.pi()
-if not pi.connected:
-    exit()
+hardware.phase('imports')
 
-pi.set_servo_pulsewidth(12, 2500)
-
-GPIO.setwarnings(False)
-
-# GPIO setup for motors
+# GPIO pins for motors; pigpio, the camera and the stepper backend open after the window is up
 DIR1, STEP1 = 20, 21  # Motor 1
 DIR2, STEP2 = 8, 7    # Motor 2
 CW, CCW = 1, 0        # Directions
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup([DIR1, STEP1, DIR2, STEP2], GPIO.OUT)
+# Motion limits for planned moves (steps/s, steps/s^2, steps/s^3); rate_calibration.py measures per-axis ones
+MAX_VELOCITY = 800
+MAX_ACCEL = 1600
+JERK = 16000
+AXIS_NUMBER = {STEP1: 1, STEP2: 2}
 
-# Initial delay
-delay = 0.0025
+def plan_move(steps, step_pins=(STEP1, STEP2)):
+    # The slowest of the axes taking part sets the limits
+    profile = hardware.unit_profile()
+    limits = [profile.motion(AXIS_NUMBER[pin], max_rate=MAX_VELOCITY, max_accel=MAX_ACCEL) for pin in step_pins]
+    return hardware.lazy_import('motion_planner').plan_move(steps, min(l['max_rate'] for l in limits),
+                                                            min(l['max_accel'] for l in limits), JERK)
 
 class MotorController(QObject):
     update_counter = pyqtSignal(int, int)
+    move_finished = pyqtSignal(int, float)
 
     def __init__(self):
         super().__init__()
         self.abort_event = threading.Event()
         self.motors = {}
         self.motor_locks = {STEP1: threading.Lock(), STEP2: threading.Lock()}
-        self.net_steps = {STEP1: 0, STEP2: 0}
 
-    def run_motor(self, dir_pin, step_pin, direction, steps):
-        with self.motor_locks[step_pin]:
-            GPIO.output(dir_pin, direction)
-            for _ in range(int(steps)):
+    @property
+    def net_steps(self):
+        # Positions are credited by the stepper backend as steps are emitted (DIR high = CW = +1)
+        return hardware.journal()
+
+    def run_linear(self, moves):
+        with self.motor_locks[STEP1], self.motor_locks[STEP2]:
+            axes = [(dir_pin, step_pin, direction) for dir_pin, step_pin, direction, _ in moves]
+            counts = [int(steps) for _, _, _, steps in moves]
+            stepper = hardware.stepper()
+            move = stepper.queue_linear_move(axes, counts, plan_move(max(counts), [axis[1] for axis in axes]))
+            while not move.wait(0.01):
                 if self.abort_event.is_set():
-                    break
-                GPIO.output(step_pin, GPIO.HIGH)
-                sleep(delay)
-                GPIO.output(step_pin, GPIO.LOW)
-                sleep(delay)
-                self.net_steps[step_pin] += 1 if direction == CW else -1
-            self.update_counter.emit(step_pin, self.net_steps[step_pin])
-
-    def add_motor(self, dir_pin, step_pin, direction, steps):
-        if step_pin in self.motors and self.motors[step_pin].is_alive():
-            self.stop_motor(step_pin)
+                    stepper.stop()
+            for _, step_pin, direction in axes:
+                self.update_counter.emit(step_pin, self.net_steps[step_pin])
+            self.move_finished.emit(move.step_pin, move.rate)
+
+    def add_linear_move(self, moves):
+        # moves are (dir_pin, step_pin, direction, steps); all axes arrive together
+        for _, step_pin, _, _ in moves:
+            if step_pin in self.motors and self.motors[step_pin].is_alive():
+                self.stop_motor(step_pin)
         self.abort_event.clear()
-        motor_thread = threading.Thread(target=self.run_motor, args=(dir_pin, step_pin, direction, steps))
+        motor_thread = threading.Thread(target=self.run_linear, args=(moves,))
         motor_thread.start()
-        self.motors[step_pin] = motor_thread
+        for _, step_pin, _, _ in moves:
+            self.motors[step_pin] = motor_thread
 
     def stop_motor(self, step_pin):
         self.abort_event.set()
@@ -74,11 +80,22 @@ class StepperControlWindow(QWidget):
         super().__init__()
         self.controller = MotorController()
         self.initUI()
-        self.capture = cv2.VideoCapture(0)
+        self.capture = None
+        QTimer.singleShot(0, self.start_hardware)
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_frame)
         self.timer.start(33)
         
+    def start_hardware(self):
+        hardware.phase('window')
+        self.update_counters(STEP1, self.controller.net_steps[STEP1])
+        self.update_counters(STEP2, self.controller.net_steps[STEP2])
+        hardware.warm_up(lambda: hardware.servo(2500), hardware.stepper, self.open_camera,
+                         lambda: hardware.lazy_import('motion_planner'))
+
+    def open_camera(self):
+        self.capture = hardware.camera()
+
     def initUI(self):
         self.layout = QVBoxLayout()
         self.label = QLabel('Motors Stopped')
@@ -104,6 +121,9 @@ class StepperControlWindow(QWidget):
 
         self.returnToZeroButton = QPushButton('Return to Zero', self)
         self.returnToZeroButton.clicked.connect(self.return_to_zero)
+
+        self.setZeroButton = QPushButton('Set Zero Here', self)
+        self.setZeroButton.clicked.connect(self.set_zero)
         
         self.quitButton = QPushButton('Quit', self)
         self.quitButton.clicked.connect(self.close)
@@ -117,6 +137,7 @@ class StepperControlWindow(QWidget):
         self.layout.addWidget(self.moveButton)
         self.layout.addWidget(self.abortButton)
         self.layout.addWidget(self.returnToZeroButton)
+        self.layout.addWidget(self.setZeroButton)
         self.layout.addWidget(self.quitButton)
         self.setLayout(self.layout)
         self.setGeometry(300, 300, 640, 480)
@@ -125,6 +146,7 @@ class StepperControlWindow(QWidget):
 
         # Connect signals
         self.controller.update_counter.connect(self.update_counters)
+        self.controller.move_finished.connect(self.show_rate)
 
     def get_steps(self, text):
         return float(text) * 60 if text.strip() else 0
@@ -134,8 +156,8 @@ class StepperControlWindow(QWidget):
         steps2 = self.get_steps(self.stepsInputMotor2.text())
         direction1 = CW if steps1 >= 0 else CCW
         direction2 = CW if steps2 >= 0 else CCW
-        self.controller.add_motor(DIR1, STEP1, direction1, abs(steps1))
-        self.controller.add_motor(DIR2, STEP2, direction2, abs(steps2))
+        self.controller.add_linear_move([(DIR1, STEP1, direction1, abs(steps1)),
+                                         (DIR2, STEP2, direction2, abs(steps2))])
 
     def stop_motors(self):
         self.controller.stop_motor(STEP1)
@@ -146,8 +168,14 @@ class StepperControlWindow(QWidget):
         steps2 = self.controller.net_steps[STEP2]
         direction1 = CCW if steps1 > 0 else CW
         direction2 = CCW if steps2 > 0 else CW
-        self.controller.add_motor(DIR1, STEP1, direction1, abs(steps1))
-        self.controller.add_motor(DIR2, STEP2, direction2, abs(steps2))
+        self.controller.add_linear_move([(DIR1, STEP1, direction1, abs(steps1)),
+                                         (DIR2, STEP2, direction2, abs(steps2))])
+
+    def set_zero(self):
+        self.stop_motors()
+        for step_pin in (STEP1, STEP2):
+            self.controller.net_steps.set(step_pin, 0)
+            self.update_counters(step_pin, 0)
 
     def update_counters(self, step_pin, count):
         if step_pin == STEP1:
@@ -155,7 +183,14 @@ class StepperControlWindow(QWidget):
         elif step_pin == STEP2:
             self.stepsCounterMotor2.setText(f'Motor 2 Steps: {count}')
 
+    def show_rate(self, step_pin, rate):
+        motor = 1 if step_pin == STEP1 else 2
+        self.label.setText(f'Move done, Motor {motor} at {rate:.0f} steps/s')
+
     def update_frame(self):
+        if self.capture is None:
+            return
+        cv2 = hardware.lazy_import('cv2')
         ret, frame = self.capture.read()
         if ret:
             frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -164,14 +199,13 @@ class StepperControlWindow(QWidget):
             convert_to_Qt_format = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
             p = convert_to_Qt_format.scaled(640, 480, Qt.KeepAspectRatio)
             self.video_label.setPixmap(QPixmap.fromImage(p))
+            mark('first_frame')
 
     def closeEvent(self, event):
-        pi.set_servo_pulsewidth(12, 500)
-        self.capture.release()
-        GPIO.cleanup()  # Properly clean up GPIOs to ensure all pins are reset
-        pi.stop()
+        hardware.shutdown()  # Servo down, camera released, GPIOs reset
         event.accept()
 
 if __name__ == "__main__":
     app = StepperControlApp(sys.argv)
+    QTimer.singleShot(0, lambda: mark('interactive'))
     sys.exit(app.exec_())
\ No newline at end of file
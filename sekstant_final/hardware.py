@@ -0,0 +1,204 @@
+import importlib
+import os
+import sys
+import threading
+import time
+
+# Print an import/init timing breakdown with --startup-profile (or SEKSTANT_STARTUP_PROFILE=1)
+PROFILE = '--startup-profile' in sys.argv or bool(os.environ.get('SEKSTANT_STARTUP_PROFILE'))
+
+# Run against simulated GPIO, pigpio, IMU, compass, LDR serial and camera with --sim (or SEKSTANT_SIM=1)
+SIM = '--sim' in sys.argv or bool(os.environ.get('SEKSTANT_SIM'))
+
+SERVO_PIN = 12
+IMU_ADDRESS = 0x69
+IMU_INT_PIN = 17      # BMI160 INT1, raised on FIFO watermark
+IMU_ODR = 100         # Hz, FIFO sample rate
+COMPASS_BUS = 1       # I2C bus of the QMC5883L compass
+SERIAL_DEVICE = '/dev/serial0'
+SERIAL_BAUD = 115200
+
+_t0 = time.perf_counter()
+_phase_start = _t0
+_resources = {}
+_locks = {}
+_locks_lock = threading.Lock()
+
+if SIM:
+    # stepper_wave and the GPIO fallback import pigpio / RPi.GPIO themselves
+    sim = importlib.import_module('sim_hardware')
+    sim.install()
+
+
+def _record(kind, name, seconds):
+    if PROFILE:
+        where = '' if threading.current_thread() is threading.main_thread() else ' (background)'
+        print(f"[startup-profile] {kind:<6} {name:<24} {seconds * 1000:8.1f} ms{where}", flush=True)
+
+
+def phase(name):
+    """ Record the time spent since the previous phase, for eager code such as a script's own imports. """
+    global _phase_start
+    now = time.perf_counter()
+    _record('phase', name, now - _phase_start)
+    _phase_start = now
+
+
+def lazy_import(name):
+    """ Import a module on first use, timing the import. """
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    _record('import', name, time.perf_counter() - start)
+    return module
+
+
+def _get(name, factory):
+    with _locks_lock:
+        lock = _locks.setdefault(name, threading.Lock())
+    with lock:
+        if name not in _resources:
+            start = time.perf_counter()
+            _resources[name] = factory()
+            _record('init', name, time.perf_counter() - start)
+        return _resources[name]
+
+
+def peek(name):
+    """ The resource if it has already been opened, else None. """
+    return _resources.get(name)
+
+
+def _open_pi():
+    pi = lazy_import('pigpio').pi()
+    if not pi.connected:
+        print("pigpiod is not running; servo disabled and steppers fall back to RPi.GPIO.")
+    return pi
+
+
+def _open_stepper():
+    return lazy_import('stepper_wave').make_stepper(pi(), journal())
+
+
+def _open_journal():
+    journal = lazy_import('position_journal')
+    # Simulated runs must not move the real axes' recorded positions
+    return journal.PositionJournal(journal.SIM_PATH if SIM else journal.DEFAULT_PATH)
+
+
+def _open_unit_profile():
+    profiles = lazy_import('unit_profile')
+    # Gains tuned on the simulator say nothing about the real unit
+    return profiles.UnitProfile(profiles.SIM_PATH if SIM else profiles.DEFAULT_PATH)
+
+
+def _open_imu():
+    if SIM:
+        return sim.IMU(IMU_ADDRESS)
+    return lazy_import('BMI160_i2c').Driver(IMU_ADDRESS)
+
+
+def _open_imu_stream():
+    imu_fifo = lazy_import('imu_fifo')
+    bus = sim.BMI160Bus() if SIM else imu_fifo.I2CBus(1)
+    return imu_fifo.IMUStream(bus, IMU_ADDRESS, pi(), IMU_INT_PIN, odr=IMU_ODR)
+
+
+def _open_compass_bus():
+    if SIM:
+        return sim.CompassBus(COMPASS_BUS)
+    return lazy_import('smbus2').SMBus(COMPASS_BUS)
+
+
+def _open_serial():
+    if SIM:
+        return sim.LDRSerial(SERIAL_DEVICE, SERIAL_BAUD, timeout=1)
+    serial = lazy_import('serial')
+    try:
+        ser = serial.Serial(SERIAL_DEVICE, SERIAL_BAUD, timeout=1)
+        print("Serial connection initialized.")
+        return ser
+    except serial.SerialException:
+        print("Failed to connect via serial.")
+        return None
+
+
+def _open_camera():
+    if SIM:
+        return sim.Camera(0)
+    return lazy_import('cv2').VideoCapture(0)
+
+
+def pi():
+    return _get('pi', _open_pi)
+
+
+def stepper():
+    return _get('stepper', _open_stepper)
+
+
+def journal():
+    return _get('journal', _open_journal)
+
+
+def unit_profile():
+    return _get('unit_profile', _open_unit_profile)
+
+
+def imu():
+    return _get('imu', _open_imu)
+
+
+def imu_stream():
+    return _get('imu_stream', _open_imu_stream)
+
+
+def compass_bus():
+    return _get('compass_bus', _open_compass_bus)
+
+
+def serial_port():
+    return _get('serial', _open_serial)
+
+
+def camera():
+    return _get('camera', _open_camera)
+
+
+def servo(pulsewidth):
+    connection = pi()
+    if connection.connected:
+        connection.set_servo_pulsewidth(SERVO_PIN, pulsewidth)
+
+
+def warm_up(*getters):
+    """ Open resources in a background thread, e.g. right after the window is shown. """
+    def run():
+        start = time.perf_counter()
+        for getter in getters:
+            getter()
+        _record('total', 'background init', time.perf_counter() - start)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def shutdown():
+    """ Release whatever was opened; resources never used are left alone. """
+    if peek('stepper') is not None:
+        _resources['stepper'].close()
+    if peek('imu_stream') is not None:
+        _resources['imu_stream'].close()
+    if peek('journal') is not None:
+        _resources['journal'].close()
+    if peek('camera') is not None:
+        _resources['camera'].release()
+    if peek('compass_bus') is not None:
+        _resources['compass_bus'].close()
+    connection = peek('pi')
+    if connection is not None and connection.connected:
+        connection.set_servo_pulsewidth(SERVO_PIN, 500)
+        connection.stop()
+    if 'RPi.GPIO' in sys.modules:
+        sys.modules['RPi.GPIO'].cleanup()
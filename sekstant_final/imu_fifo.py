@@ -0,0 +1,171 @@
+import threading
+import time
+
+import numpy as np
+
+# BMI160 registers
+FIFO_LENGTH_0 = 0x22
+FIFO_DATA = 0x24
+ACC_CONF = 0x40
+ACC_RANGE = 0x41
+GYR_CONF = 0x42
+GYR_RANGE = 0x43
+FIFO_CONFIG_0 = 0x46
+FIFO_CONFIG_1 = 0x47
+INT_EN_1 = 0x51
+INT_OUT_CTRL = 0x53
+INT_MAP_1 = 0x56
+CMD = 0x7E
+
+CMD_ACC_NORMAL = 0x11
+CMD_GYR_NORMAL = 0x15
+CMD_FIFO_FLUSH = 0xB0
+
+FIFO_ACC_GYR = 0xC0          # Headerless frames: gyro xyz then accel xyz, int16 LE
+FIFO_SIZE = 1024
+FRAME_BYTES = 12
+INT_FWM = 0x40               # FIFO watermark interrupt (enable bit and INT1 map bit)
+INT1_PUSH_PULL_HIGH = 0x0A   # INT1 output enabled, active high, push-pull, level
+
+BWP_NORMAL = 0x20
+ACC_LSB = 16384.0            # per g at +-2 g
+GYR_LSB = 16.4               # per deg/s at +-2000 deg/s
+MAX_BLOCK = FIFO_SIZE // FRAME_BYTES * FRAME_BYTES  # Bytes per I2C transfer, whole frames
+
+# Output data rate codes shared by ACC_CONF and GYR_CONF
+ODR_CODES = {25: 0x06, 50: 0x07, 100: 0x08, 200: 0x09, 400: 0x0A, 800: 0x0B, 1600: 0x0C}
+
+
+class I2CBus:
+    """ Register access on a smbus2 bus. """
+
+    def __init__(self, bus=1):
+        import smbus2
+        self.smbus2 = smbus2
+        self.bus = smbus2.SMBus(bus)
+
+    def write_byte(self, address, register, value):
+        self.bus.write_byte_data(address, register, value)
+
+    def read_block(self, address, register, length):
+        # Combined write/read transfer; read_i2c_block_data stops at 32 bytes
+        write = self.smbus2.i2c_msg.write(address, [register])
+        read = self.smbus2.i2c_msg.read(address, length)
+        self.bus.i2c_rdwr(write, read)
+        return bytes(read)
+
+    def close(self):
+        self.bus.close()
+
+
+class Burst:
+    """ Samples drained from the FIFO in one go, as arrays. """
+
+    def __init__(self, t, gyro, accel, dt):
+        self.t = t            # monotonic seconds per sample
+        self.dt = dt          # sample period
+        self.gyro = gyro      # (n, 3) deg/s
+        self.accel = accel    # (n, 3) g
+        ax, ay, az = accel.T
+        self.roll = np.degrees(np.arctan2(ay, az))
+        self.tilt = np.degrees(np.arctan2(ax, az))
+        # Rates of the two angles above, for sensor_fusion
+        self.roll_rate = gyro[:, 0]
+        self.tilt_rate = -gyro[:, 1]
+
+    def __len__(self):
+        return len(self.t)
+
+
+class IMUStream:
+    """
+    BMI160 sampled through its FIFO.
+
+    The sensor fills its FIFO at `odr` Hz and raises INT1 when `watermark`
+    frames are waiting. The reader thread then drains the FIFO in block
+    reads and hands each burst, already converted to angles, to the
+    subscribers. A missed edge only delays a burst: the thread also wakes
+    after two watermark periods.
+    """
+
+    def __init__(self, bus, address=0x69, pi=None, int_pin=None, odr=100, watermark=10):
+        self.bus = bus
+        self.address = address
+        self.odr = odr
+        self.watermark = watermark
+        self.subscribers = []
+        self.ready = threading.Event()
+        self.running = True
+        self.samples = 0
+        self.bursts = 0
+        self.overflows = 0
+        self.started = time.monotonic()
+        self.configure()
+        self.edge = None
+        if pi is not None and int_pin is not None and pi.connected:
+            self.edge = pi.callback(int_pin, 0, lambda gpio, level, tick: self.ready.set())
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def configure(self):
+        write = lambda register, value: self.bus.write_byte(self.address, register, value)
+        write(CMD, CMD_ACC_NORMAL)
+        time.sleep(0.005)
+        write(CMD, CMD_GYR_NORMAL)
+        time.sleep(0.08)
+        write(ACC_CONF, BWP_NORMAL | ODR_CODES[self.odr])
+        write(ACC_RANGE, 0x03)
+        write(GYR_CONF, BWP_NORMAL | ODR_CODES[self.odr])
+        write(GYR_RANGE, 0x00)
+        write(FIFO_CONFIG_0, self.watermark * FRAME_BYTES // 4)
+        write(FIFO_CONFIG_1, FIFO_ACC_GYR)
+        write(INT_OUT_CTRL, INT1_PUSH_PULL_HIGH)
+        write(INT_MAP_1, INT_FWM)
+        write(INT_EN_1, INT_FWM)
+        write(CMD, CMD_FIFO_FLUSH)
+
+    def subscribe(self, func):
+        """ Call func(burst) from the reader thread for every drained burst. """
+        self.subscribers.append(func)
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        return {'samples': self.samples, 'bursts': self.bursts, 'overflows': self.overflows,
+                'rate': self.samples / elapsed if elapsed > 0 else 0.0}
+
+    def close(self):
+        self.running = False
+        self.ready.set()
+        if self.edge is not None:
+            self.edge.cancel()
+
+    def drain(self):
+        """ Read every complete frame out of the FIFO; returns a Burst or None. """
+        low, high = self.bus.read_block(self.address, FIFO_LENGTH_0, 2)
+        length = (low | (high & 0x07) << 8) // FRAME_BYTES * FRAME_BYTES
+        if not length:
+            return None
+        if length >= FIFO_SIZE - FRAME_BYTES:
+            self.overflows += 1
+        data = b''.join(self.bus.read_block(self.address, FIFO_DATA, min(MAX_BLOCK, length - start))
+                        for start in range(0, length, MAX_BLOCK))
+        now = time.monotonic()
+        raw = np.frombuffer(data, dtype='<i2').reshape(-1, 6)
+        # The newest frame is the one just read; the others are one ODR period apart
+        t = now - np.arange(len(raw) - 1, -1, -1) / self.odr
+        return Burst(t, raw[:, :3] / GYR_LSB, raw[:, 3:] / ACC_LSB, 1.0 / self.odr)
+
+    def _run(self):
+        timeout = 2 * self.watermark / self.odr
+        while self.running:
+            self.ready.wait(timeout)
+            self.ready.clear()
+            if not self.running:
+                break
+            burst = self.drain()
+            if burst is None:
+                continue
+            self.samples += len(burst)
+            self.bursts += 1
+            for func in self.subscribers:
+                func(burst)
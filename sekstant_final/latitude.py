@@ -1,86 +1,82 @@
 import sys
 import threading
+import hardware
 from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout, QPushButton, QFrame
 from PyQt5.QtGui import QImage, QPixmap
-from PyQt5.QtCore import Qt, QTimer
-import RPi.GPIO as GPIO
-from time import sleep
-import cv2
-import pigpio
-import math
-from collections import deque
-from BMI160_i2c import Driver  # Import the BMI160 driver
-
-# Connect to pigpio
-pi = pigpio.pi()
-pi.set_servo_pulsewidth(12, 2500)
-
-GPIO.setwarnings(False)
-
-# GPIO setup for motors
+from PyQt5.QtCore import Qt, QTimer, QObject, pyqtSignal
+import time
+from stepper_wave import constant_intervals
+from startup_metrics import mark
+import sensor_fusion
+
+hardware.phase('imports')
+
+# GPIO pins for motors; pigpio, the IMU, the camera and the stepper backend open after the window is up
 DIR1, STEP1 = 20, 21  # Motor 1
 DIR2, STEP2 = 8, 7    # Motor 2
 CW, CCW = 1, 0        # Directions are now simple: CW increments, CCW decrements
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(DIR1, GPIO.OUT)
-GPIO.setup(STEP1, GPIO.OUT)
-GPIO.setup(DIR2, GPIO.OUT)
-GPIO.setup(STEP2, GPIO.OUT)
-
-# Steps counter for both motors initialized to 0
-steps_counter = {STEP1: 0, STEP2: 0}
-
-# IMU setup
-sensor = Driver(0x69)  # Initialize the IMU sensor
+# Step positions persist across runs; the stepper backend credits every emitted step
+steps_counter = hardware.journal()
 
 # Delay setup
 delay = 0.0025  # You can adjust this for smoother or faster operation
+# Never step faster than rate_calibration.py measured the axis can follow
+step_delay = {STEP1: hardware.unit_profile().step_delay(1, delay), STEP2: hardware.unit_profile().step_delay(2, delay)}
+
+# Gyro+accelerometer fusion per IMU sample (--kalman for the Kalman filter)
+roll_filter = sensor_fusion.make_filter()
+yaw_filter = sensor_fusion.make_filter()
 
-# Define the FIR filter length
-FILTER_LENGTH = 10
-roll_filter_queue = deque(maxlen=FILTER_LENGTH)
-yaw_filter_queue = deque(maxlen=FILTER_LENGTH)
+# The IMU FIFO is sampled off the step path; labels refresh at a lower fixed rate
+DISPLAY_RATE_HZ = 10
 
-def calculate_fir_average(queue):
-    return sum(queue) / len(queue) if queue else 0
+# Latest fused (roll, yaw); replaced as a whole so readers never see a half-written pair
+imu_snapshot = (0.0, 0.0)
 
 def step_motor(dir_pin, step_pin, direction, running):
-    while running():
-        GPIO.output(dir_pin, direction)
-        GPIO.output(step_pin, GPIO.HIGH)
-        sleep(delay)
-        GPIO.output(step_pin, GPIO.LOW)
-        sleep(delay)
-        if direction == CW:
-            steps_counter[step_pin] += 1
-        else:
-            steps_counter[step_pin] -= 1
-        
-        if steps_counter[step_pin] == 0:
-            update_steps_display()  # Update display right before breaking
-            break  # Stop moving if zero is reached
-        update_steps_display()
-
-def update_steps_display():
-    global mainWindow
-    ax, ay, az = sensor.getMotion6()[3:6]
-    roll = math.atan2(ay, az)
-    roll_deg = math.degrees(roll)
-    imu_angle = -roll_deg  # Invert roll to become the IMU angle
-    yaw_deg = math.degrees(math.atan2(ax, az))  # Example yaw calculation
-    
-    # Add values to filter queues
-    roll_filter_queue.append(imu_angle)
-    yaw_filter_queue.append(yaw_deg)
-
-    # Calculate filtered values
-    filtered_roll = calculate_fir_average(roll_filter_queue)
-    filtered_yaw = calculate_fir_average(yaw_filter_queue)
-
-    mainWindow.stepsLabel.setText(f"Steps to zero: Motor 1: {steps_counter[STEP1]}, Motor 2: {steps_counter[STEP2]}")
-    mainWindow.degreesLabel.setText(f"Angle Horizon: Motor 1: {steps_counter[STEP1] / 60:.2f}, Angle Rot: Motor 2: {steps_counter[STEP2] / 60:.2f}")
-    mainWindow.imuLabel.setText(f"IMU Angle Horizon: {filtered_roll:.2f} degrees, IMU Angle Rot: {filtered_yaw:.2f} degrees")
+    # Moving towards zero stops there, moving away runs until released
+    stepper = hardware.stepper()
+    count = steps_counter[step_pin]
+    towards_zero = count != 0 and (count < 0) == (direction == CW)
+    move = stepper.queue_move(dir_pin, step_pin, direction,
+                              constant_intervals(abs(count) if towards_zero else None, step_delay[step_pin]))
+    # Positions reach the display through the journal; nothing here waits on the GUI or the IMU
+    while not move.wait(0.05):
+        if not running():
+            stepper.stop(step_pin)
+
+def on_imu_burst(burst):
+    # Runs on the IMU reader thread at the FIFO sample rate
+    global imu_snapshot
+    imu_angle = roll_filter.update_burst(-burst.roll, -burst.roll_rate, burst.dt)  # Inverted roll is the IMU angle
+    yaw = yaw_filter.update_burst(burst.tilt, burst.tilt_rate, burst.dt)
+    imu_snapshot = (float(imu_angle[-1]), float(yaw[-1]))
+
+def open_imu():
+    hardware.imu_stream().subscribe(on_imu_burst)
+
+class DisplayPublisher(QObject):
+    """ Emits one coalesced display update per refresh period, whatever the step and IMU rates. """
+    refresh = pyqtSignal(int, int, float, float)
+    status = pyqtSignal(str)
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        period = 1.0 / DISPLAY_RATE_HZ
+        deadline = time.monotonic()
+        while True:
+            roll, yaw = imu_snapshot
+            self.refresh.emit(steps_counter[STEP1], steps_counter[STEP2], roll, yaw)
+            # Fixed-rate schedule: a late wakeup shortens the next sleep rather than drifting
+            deadline += period
+            delay_s = deadline - time.monotonic()
+            if delay_s > 0:
+                time.sleep(delay_s)
+            else:
+                deadline = time.monotonic()
 
 class StepperControlApp(QApplication):
     def __init__(self, args):
@@ -93,12 +89,24 @@ class StepperControlWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.initUI()
+        self.publisher = DisplayPublisher()
+        self.publisher.refresh.connect(self.update_steps_display)
+        self.publisher.status.connect(self.label.setText)
+        self.publisher.start()
         self.motor_threads = {}
-        self.capture = cv2.VideoCapture(0)  # Open the default camera
+        self.capture = None  # Opened in the background once the window is up
+        QTimer.singleShot(0, self.start_hardware)
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_frame)
-        self.timer.start(100)  # Refresh every 100 ms for sensor data too
+        self.timer.start(100)
         
+    def start_hardware(self):
+        hardware.phase('window')
+        hardware.warm_up(lambda: hardware.servo(2500), open_imu, hardware.stepper, self.open_camera)
+
+    def open_camera(self):
+        self.capture = hardware.camera()
+
     def initUI(self):
         self.layout = QVBoxLayout()
         self.label = QLabel('Motors Stopped')
@@ -128,7 +136,8 @@ class StepperControlWindow(QWidget):
         self.show()
 
     def reset_to_zero(self):
-        for step_pin, count in steps_counter.items():
+        for step_pin in (STEP1, STEP2):
+            count = steps_counter[step_pin]
             if count != 0:
                 dir_pin = DIR1 if step_pin == STEP1 else DIR2
                 direction = CW if count < 0 else CCW  # Choose direction based on sign of the step count
@@ -139,6 +148,9 @@ class StepperControlWindow(QWidget):
                 self.motor_threads[step_pin] = (thread, running)
 
     def update_frame(self):
+        if self.capture is None:
+            return
+        cv2 = hardware.lazy_import('cv2')
         ret, frame = self.capture.read()
         if ret:
             frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -150,7 +162,12 @@ class StepperControlWindow(QWidget):
             convert_to_Qt_format = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
             p = convert_to_Qt_format.scaled(640, 480, Qt.KeepAspectRatio)
             self.video_label.setPixmap(QPixmap.fromImage(p))
-        update_steps_display()  # Update sensor readings continuously
+            mark('first_frame')
+
+    def update_steps_display(self, steps1, steps2, roll, yaw):
+        self.stepsLabel.setText(f"Steps to zero: Motor 1: {steps1}, Motor 2: {steps2}")
+        self.degreesLabel.setText(f"Angle Horizon: Motor 1: {steps1 / 60:.2f}, Angle Rot: Motor 2: {steps2 / 60:.2f}")
+        self.imuLabel.setText(f"IMU Angle Horizon: {roll:.2f} degrees, IMU Angle Rot: {yaw:.2f} degrees")
 
     def keyPressEvent(self, event):
         key = event.key()
@@ -171,25 +188,25 @@ class StepperControlWindow(QWidget):
 
     def control_motor(self, key, running, direction):
         if key == Qt.Key_W:
-            self.label.setText('Motor 1 Moving CW')
+            self.publisher.status.emit('Motor 1 Moving CW')
             step_motor(DIR1, STEP1, CW, running)
         elif key == Qt.Key_S:
-            self.label.setText('Motor 1 Moving CCW')
+            self.publisher.status.emit('Motor 1 Moving CCW')
             step_motor(DIR1, STEP1, CCW, running)
         elif key == Qt.Key_A:
-            self.label.setText('Motor 2 Moving CW')
+            self.publisher.status.emit('Motor 2 Moving CW')
             step_motor(DIR2, STEP2, CW, running)
         elif key == Qt.Key_D:
-            self.label.setText('Motor 2 Moving CCW')
+            self.publisher.status.emit('Motor 2 Moving CCW')
             step_motor(DIR2, STEP2, CCW, running)
-        self.label.setText('Motor Stopped')
+        self.publisher.status.emit(f'Motor Stopped ({hardware.stepper().last_rate:.0f} steps/s)')
 
 
     def closeEvent(self, event):
         # Set servo to specific pulse width before closing
-        pi.set_servo_pulsewidth(12, 500)
-        self.capture.release()
+        hardware.shutdown()
 
 if __name__ == "__main__":
     app = StepperControlApp(sys.argv)
+    QTimer.singleShot(0, lambda: mark('interactive'))
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,178 @@
+import struct
+from binascii import crc_hqx
+
+import numpy as np
+
+# Frame: sync word, sequence number, four LDR readings, CRC-16/CCITT over seq+readings
+SYNC = b'\xa5\x5a'
+BODY = struct.Struct('<B4H')
+FRAME_SIZE = len(SYNC) + BODY.size + 2
+CRC_INIT = 0xFFFF
+
+BATCH_BYTES = 4 * FRAME_SIZE   # Shorter reads are decoded without numpy
+DETECT_KEEP = 64               # Bytes held while the mode is unknown: a partial frame or line
+
+_OFFSETS = np.arange(FRAME_SIZE)
+
+
+def encode_frame(seq, values):
+    """ One binary frame, as the ESP32 sends it. """
+    body = BODY.pack(seq & 0xFF, *values)
+    return SYNC + body + struct.pack('<H', crc_hqx(body, CRC_INIT))
+
+
+def _frame_ok(buffer, start):
+    body = buffer[start + len(SYNC):start + FRAME_SIZE - 2]
+    return crc_hqx(body, CRC_INIT) == int.from_bytes(buffer[start + FRAME_SIZE - 2:start + FRAME_SIZE], 'little')
+
+
+def _parse_line(line):
+    """ The four readings of an "a,b,c,d" line, or None. """
+    fields = line.strip().split(b',')
+    if len(fields) != 4:
+        return None
+    try:
+        return [int(field) for field in fields]
+    except ValueError:
+        return None
+
+
+class LDRDecoder:
+    """
+    Decodes the LDR stream into (n, 4) arrays, a whole read buffer at a time.
+
+    Binary frames are located with one vectorized search for the sync word
+    and checked by CRC; reads too short to amortize numpy take a plain
+    bytes path. The mode is settled by the first CRC-valid frame (binary)
+    or whole line of four integers (text, the old "a,b,c,d" lines); until
+    then the tail of the input is kept, since a read often starts
+    mid-frame. Counts of frames lost to CRC errors, sequence gaps and
+    unparseable lines are kept in `stats()`.
+    """
+
+    def __init__(self):
+        self.mode = None
+        self.buffer = b''
+        self.last_seq = None
+        self.frames = 0
+        self.lost = 0
+        self.crc_errors = 0
+        self.skipped_bytes = 0
+        self.bad_lines = 0
+
+    def stats(self):
+        return {'mode': self.mode, 'frames': self.frames, 'lost': self.lost, 'crc_errors': self.crc_errors,
+                'skipped_bytes': self.skipped_bytes, 'bad_lines': self.bad_lines}
+
+    def reset(self):
+        """ Forget any partial frame, the sequence number and the mode, e.g. after input was discarded. """
+        self.mode = None
+        self.buffer = b''
+        self.last_seq = None
+
+    def feed(self, data):
+        """ Add received bytes; returns the readings of every complete frame as a float (n, 4) array. """
+        buffer = self.buffer + data
+        if self.mode is None:
+            self.mode = self._detect(buffer)
+            if self.mode is None:
+                self.buffer = buffer[-DETECT_KEEP:]
+                self.skipped_bytes += len(buffer) - len(self.buffer)
+                return np.empty((0, 4))
+        if self.mode == 'text':
+            return self._feed_text(buffer)
+        return self._feed_binary(buffer)
+
+    def _detect(self, buffer):
+        start = buffer.find(SYNC)
+        while 0 <= start <= len(buffer) - FRAME_SIZE:
+            if _frame_ok(buffer, start):
+                return 'binary'
+            start = buffer.find(SYNC, start + 1)
+        if any(_parse_line(line) is not None for line in buffer.split(b'\n')[:-1]):
+            return 'text'
+        return None
+
+    def _feed_binary(self, buffer):
+        if len(buffer) < BATCH_BYTES:
+            return self._feed_binary_small(buffer)
+        raw = np.frombuffer(buffer, dtype=np.uint8)
+        starts = np.flatnonzero((raw[:-1] == SYNC[0]) & (raw[1:] == SYNC[1]))
+        starts = starts[starts + FRAME_SIZE <= len(raw)]
+        frames = raw[starts[:, None] + _OFFSETS] if len(starts) else np.empty((0, FRAME_SIZE), np.uint8)
+
+        # CRC per candidate; a sync pattern inside a payload fails here
+        crc_sent = frames[:, -2].astype(np.uint16) | frames[:, -1].astype(np.uint16) << 8
+        bodies = frames[:, 2:-2]
+        valid = np.fromiter((crc_hqx(body.tobytes(), CRC_INIT) for body in bodies), dtype=np.uint16,
+                            count=len(bodies)) == crc_sent
+        rejected = starts[~valid]
+        starts, frames = starts[valid], frames[valid]
+        if len(starts) > 1 and np.any(np.diff(starts) < FRAME_SIZE):
+            keep, end = [], -1
+            for i, start in enumerate(starts):
+                if start >= end:
+                    keep.append(i)
+                    end = start + FRAME_SIZE
+            starts, frames = starts[keep], frames[keep]
+
+        # Rejected syncs inside accepted frames are payload bytes, not lost frames
+        inside = np.zeros(len(rejected), dtype=bool)
+        if len(starts):
+            owner = np.searchsorted(starts, rejected, side='right') - 1
+            inside = (owner >= 0) & (rejected < starts[np.maximum(owner, 0)] + FRAME_SIZE)
+        self.crc_errors += int(np.count_nonzero(~inside))
+        self._consume(buffer, starts[-1] + FRAME_SIZE if len(starts) else 0, len(starts))
+        if not len(frames):
+            return np.empty((0, 4))
+        self._count_sequence(frames[:, 2].tolist())
+        return frames[:, 3:11].copy().view('<u2').astype(float)
+
+    def _feed_binary_small(self, buffer):
+        # A frame or two per read: plain bytes operations beat the numpy setup cost
+        rows, seqs, pos, end = [], [], 0, 0
+        while True:
+            start = buffer.find(SYNC, pos)
+            if start < 0 or start + FRAME_SIZE > len(buffer):
+                break
+            if not _frame_ok(buffer, start):
+                self.crc_errors += 1
+                pos = start + 1
+                continue
+            seq, *values = BODY.unpack(buffer[start + len(SYNC):start + FRAME_SIZE - 2])
+            seqs.append(seq)
+            rows.append(values)
+            pos = end = start + FRAME_SIZE
+        self._consume(buffer, end, len(rows))
+        if not rows:
+            return np.empty((0, 4))
+        self._count_sequence(seqs)
+        return np.array(rows, dtype=float)
+
+    def _consume(self, buffer, end, count):
+        # Every start position with a whole frame after it has been examined
+        consumed = max(end, len(buffer) - FRAME_SIZE + 1, 0)
+        self.skipped_bytes += int(consumed - count * FRAME_SIZE)
+        self.buffer = buffer[consumed:]
+
+    def _count_sequence(self, seq):
+        """ Frames missing from the 8-bit sequence numbers, including the gap since the last feed. """
+        self.frames += len(seq)
+        previous = self.last_seq
+        for number in seq:
+            if previous is not None:
+                self.lost += (number - previous - 1) % 256
+            previous = number
+        self.last_seq = previous
+
+    def _feed_text(self, buffer):
+        *lines, self.buffer = buffer.split(b'\n')
+        rows = []
+        for line in lines:
+            values = _parse_line(line)
+            if values is None:
+                self.bad_lines += 1
+            else:
+                rows.append(values)
+        self.frames += len(rows)
+        return np.array(rows, dtype=float).reshape(-1, 4)
@@ -0,0 +1,81 @@
+import numpy as np
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QWidget, QVBoxLayout
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+
+MAX_POINTS = 2000     # Points handed to matplotlib, however long the session
+REFRESH_MS = 100
+HEADROOM = 0.1        # Axis margin added when the data leaves the current limits
+
+
+def minmax_decimate(t, v, buckets):
+    """ First/min/max/last of each of `buckets` equal-count buckets, in time order. """
+    n = len(t)
+    if n <= 4 * buckets:
+        return t, v
+    size = n // buckets
+    head_t = t[:buckets * size].reshape(buckets, size)
+    head_v = v[:buckets * size].reshape(buckets, size)
+    rows = np.arange(buckets)
+    picks = np.column_stack([np.zeros(buckets, dtype=int), head_v.argmin(axis=1),
+                             head_v.argmax(axis=1), np.full(buckets, size - 1)])
+    picks.sort(axis=1)
+    out_t = head_t[rows[:, None], picks].ravel()
+    out_v = head_v[rows[:, None], picks].ravel()
+    return np.concatenate([out_t, t[buckets * size:]]), np.concatenate([out_v, v[buckets * size:]])
+
+
+class LivePlot(QWidget):
+    """
+    Chart of a TimeSeries that redraws only its line on each refresh.
+
+    The axes background is cached and blitted; a full redraw happens only
+    when the data outgrows the current limits or the widget is resized.
+    """
+
+    def __init__(self, series, xlabel='Time (s)', ylabel='IMU Angle (degrees)', parent=None):
+        super().__init__(parent)
+        self.series = series
+        self.figure = Figure(figsize=(5, 3), tight_layout=True)
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.axes = self.figure.add_subplot(111)
+        self.axes.set_xlabel(xlabel)
+        self.axes.set_ylabel(ylabel)
+        self.line, = self.axes.plot([], [], animated=True)
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(REFRESH_MS)
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self.axes.draw_artist(self.line)
+
+    def refresh(self):
+        t, v = self.series.arrays()
+        if not len(t):
+            return
+        t, v = minmax_decimate(t, v, MAX_POINTS // 4)
+        self.line.set_data(t, v)
+        if self.background is None or self._rescale(t, v):
+            self.canvas.draw()  # Recaptures the background through draw_event
+            return
+        self.canvas.restore_region(self.background)
+        self.axes.draw_artist(self.line)
+        self.canvas.blit(self.axes.bbox)
+
+    def _rescale(self, t, v):
+        (x0, x1), (y0, y1) = self.axes.get_xlim(), self.axes.get_ylim()
+        t_min, t_max, v_min, v_max = t[0], t[-1], float(v.min()), float(v.max())
+        if x0 <= t_min and t_max <= x1 and y0 <= v_min and v_max <= y1:
+            return False
+        span_t, span_v = max(t_max - t_min, 1.0), max(v_max - v_min, 0.1)
+        self.axes.set_xlim(t_min, t_max + span_t * HEADROOM * 2)
+        self.axes.set_ylim(v_min - span_v * HEADROOM, v_max + span_v * HEADROOM)
+        return True
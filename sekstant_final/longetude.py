@@ -1,101 +1,123 @@
 import sys
 import threading
-import matplotlib
-matplotlib.use('Qt5Agg')
-import matplotlib.pyplot as plt
+import hardware
 from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout, QPushButton
 from PyQt5.QtCore import Qt, QTimer, QTime, QDateTime
-import RPi.GPIO as GPIO
-from time import sleep
-import serial
-import math
-from BMI160_i2c import Driver
-
-# Serial setup
-try:
-    ser = serial.Serial('/dev/serial0', 115200, timeout=1)
-    print("Serial connection initialized.")
-except serial.SerialException:
-    print("Failed to connect via serial.")
-    sys.exit(1)
-
-# GPIO setup
+import os
+import time
+import numpy as np
+import sensor_fusion
+from stream_filters import EMA
+from serial_reader import SerialReader
+from ldr_protocol import LDRDecoder
+from pid import PID
+from transit import estimate_transit, FIT_WINDOW_S
+from ephemeris import sun_rate, transit_longitude, zone_longitude
+from timeseries import TimeSeries
+from startup_metrics import mark
+
+hardware.phase('imports')
+
+# GPIO pins; serial, IMU and stepper backend are opened by the worker threads
 DIR1, STEP1, DIR2, STEP2 = 20, 21, 8, 7
 CW, CCW = 0, 1
-GPIO.setwarnings(False)
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(DIR1, GPIO.OUT)
-GPIO.setup(STEP1, GPIO.OUT)
-GPIO.setup(DIR2, GPIO.OUT)
-GPIO.setup(STEP2, GPIO.OUT)
-
-delay = 0.005
-
-# PI controller constants and variables
-Kp, Ki = 1, 0.000
-integral1, integral2 = 0, 0
-prev_error1, prev_error2 = 0, 0
+
+MAX_ACCEL = 400  # steps/s^2 when the tracking rate changes
+
+# Velocity-mode tracking: the control loop only sets each axis' step rate
+axis1, axis2 = None, None
+
+# PID controller per axis; gains are per second, output is steps/s
+CONTROL_HZ = 20
+Kp, Ki, Kd = 1, 0.0, 0.0
+MAX_STEP = 100
+# Gains measured by autotune.py for this unit replace the defaults above
+pid1 = PID(dt=1 / CONTROL_HZ, **hardware.unit_profile().gains('velocity', 1, kp=Kp, ki=Ki, kd=Kd, limit=MAX_STEP))
+pid2 = PID(dt=1 / CONTROL_HZ, **hardware.unit_profile().gains('velocity', 2, kp=Kp, ki=Ki, kd=Kd, limit=MAX_STEP))
+
+# Feed-forward: axis 1 follows the sun's altitude (the IMU angle), axis 2 its azimuth, at the
+# ephemeris rate; the PID only trims the residual the LDRs still see. Needs "site": {"latitude": ...}
+# in the unit profile and the degrees per step rate_calibration.py measured, else it stays off.
+SKY_SIGN = {1: -1, 2: 1}   # The IMU angle is the inverted roll (see on_imu_burst); azimuth is the tilt as measured
+feed_forward = (0.0, 0.0)
 smooth_ldr1, smooth_ldr2, smooth_ldr3, smooth_ldr4 = 0, 0, 0, 0
 alpha = 0.1
+ldr_smoothing = EMA(alpha, initial=np.zeros(4))
+ldr_decoder = LDRDecoder()
 
 # Global variables for GUI and plotting
 current_imu_angle = 0.0
 max_imu_angle = 0.0
 time_of_max_imu_angle = ""
 tracking_active = False
+ldr_reader = None
 longitude = None
-imu_angle_history = []
-time_history = []
-filter_size = 10  # Size of the FIR filter
-imu_angle_filtered = []
-
-# Initialize the IMU sensor
-sensor = Driver(0x69)
-print('IMU sensor initialization done')
-
-def pi_control(target, prev_error, integral):
-    error = target
-    integral += error
-    output = Kp * error + Ki * integral
-    max_step = 100
-    output = max(-max_step, min(max_step, output))
-    return output, error, integral
-
-def motor_control(motor_dir_pin, motor_step_pin, direction, steps):
-    if tracking_active:
-        GPIO.output(motor_dir_pin, direction)
-        for _ in range(abs(steps)):
-            GPIO.output(motor_step_pin, GPIO.HIGH)
-            sleep(delay)
-            GPIO.output(motor_step_pin, GPIO.LOW)
-            sleep(delay)
+longitude_ci = None
+# Filtered IMU angle against seconds since the first sample; older samples spill to disk.
+# Opened when tracking first starts, since opening truncates the previous run's spill file
+IMU_HISTORY_PATH = os.path.expanduser('~/.sekstant/imu_history.bin')
+imu_history = None
+imu_filter = sensor_fusion.make_filter()  # Gyro+accelerometer fusion (--kalman for the Kalman filter)
+imu_start = None        # Monotonic time of the first sample; imu_history counts from here
+imu_utc_offset = None   # UTC epoch seconds minus monotonic seconds, taken at the first sample
+
+def steps_per_sky_degree(profile):
+    """ Signed steps per degree of altitude (axis 1) and azimuth (axis 2), or None where uncalibrated. """
+    result = {}
+    for axis in (1, 2):
+        deg_per_step = profile.motion(axis).get('deg_per_step')
+        result[axis] = SKY_SIGN[axis] / deg_per_step if deg_per_step else None
+    return result
+
+def feed_forward_rates(latitude, site_longitude, scale):
+    """ Step rates that follow the sun by themselves, from the per-minute ephemeris. """
+    if latitude is None:
+        return 0.0, 0.0
+    # This run's measured longitude once there is one
+    rates = sun_rate(latitude, longitude if longitude is not None else site_longitude)
+    return tuple(rate * scale[axis] if scale[axis] is not None else 0.0 for axis, rate in zip((1, 2), rates))
 
 def ldr_thread():
-    global integral1, integral2, prev_error1, prev_error2, smooth_ldr1, smooth_ldr2, smooth_ldr3, smooth_ldr4
-    while True:
-        if tracking_active and ser.in_waiting > 0:
-            line = ser.readline().decode('utf-8').strip()
-            ldr_values = line.split(',')
-            if len(ldr_values) == 4:
-                try:
-                    smooth_ldr1 = smooth_ldr1 * (1 - alpha) + int(ldr_values[0]) * alpha
-                    smooth_ldr2 = smooth_ldr2 * (1 - alpha) + int(ldr_values[1]) * alpha
-                    smooth_ldr3 = smooth_ldr3 * (1 - alpha) + int(ldr_values[2]) * alpha
-                    smooth_ldr4 = smooth_ldr4 * (1 - alpha) + int(ldr_values[3]) * alpha
-
-                    difference1 = smooth_ldr1 - smooth_ldr2
-                    difference2 = smooth_ldr3 - smooth_ldr4
-
-                    direction1 = CW if difference1 < 0 else CCW
-                    direction2 = CW if difference2 < 0 else CCW
-
-                    steps1, prev_error1, integral1 = pi_control(difference1, prev_error1, integral1)
-                    steps2, prev_error2, integral2 = pi_control(difference2, prev_error2, integral2)
-
-                    threading.Thread(target=motor_control, args=(DIR1, STEP1, direction1, int(steps1))).start()
-                    threading.Thread(target=motor_control, args=(DIR2, STEP2, direction2, int(steps2))).start()
-                except ValueError:
-                    print("Error: Non-integer values received. Check the data format.")
+    global smooth_ldr1, smooth_ldr2, smooth_ldr3, smooth_ldr4, axis1, axis2, ldr_reader, feed_forward
+    ser = hardware.serial_port()
+    if ser is None:
+        return
+    stepper = hardware.stepper()
+    profile = hardware.unit_profile()
+    # Ramp no harder than rate_calibration.py measured each axis can follow
+    axis1 = stepper.queue_velocity(DIR1, STEP1, min(MAX_ACCEL, profile.motion(1, max_accel=MAX_ACCEL)['max_accel']), positive=CCW)
+    axis2 = stepper.queue_velocity(DIR2, STEP2, min(MAX_ACCEL, profile.motion(2, max_accel=MAX_ACCEL)['max_accel']), positive=CCW)
+    site = profile.section('site')
+    # Until a transit has been measured, the time zone's longitude is close enough for the rates
+    latitude, site_longitude = site.get('latitude'), site.get('longitude', zone_longitude())
+    scale = steps_per_sky_degree(profile)
+    # Blocks in select() until bytes arrive or tracking is switched on/off
+    ldr_reader = SerialReader(ser, active=False)
+    # Start pressed while the port was opening found no reader to switch on
+    ldr_reader.set_active(tracking_active)
+    for chunk in ldr_reader.chunks():
+        if chunk is None:
+            ldr_decoder.reset()
+            continue
+        ldr_values = ldr_decoder.feed(chunk)
+        if not len(ldr_values):
+            continue
+        # Smooth the whole backlog in one pass; control acts on the newest state only
+        smooth_ldr1, smooth_ldr2, smooth_ldr3, smooth_ldr4 = ldr_smoothing.update_batch(ldr_values)[-1]
+
+        # Act at CONTROL_HZ; faster samples only feed the smoothing
+        if not pid1.due():
+            continue
+        difference1 = smooth_ldr1 - smooth_ldr2
+        difference2 = smooth_ldr3 - smooth_ldr4
+
+        feed_forward = feed_forward_rates(latitude, site_longitude, scale)
+        rate1 = feed_forward[0] + pid1.update(difference1)
+        rate2 = feed_forward[1] + pid2.update(difference2)
+
+        axis1.set_rate(rate1)
+        axis2.set_rate(rate2)
+        ldr_reader.actuated()
 
 class MainWindow(QWidget):
     def __init__(self):
@@ -123,6 +145,9 @@ class MainWindow(QWidget):
         self.longitudeLabel = QLabel("Longitude: Not Calculated")
         self.layout.addWidget(self.longitudeLabel)
 
+        self.rateLabel = QLabel('Motor rates: 0 / 0 steps/s')
+        self.layout.addWidget(self.rateLabel)
+
         self.startButton = QPushButton('Start Tracking', self)
         self.startButton.clicked.connect(self.start_tracking)
         self.layout.addWidget(self.startButton)
@@ -131,7 +156,8 @@ class MainWindow(QWidget):
         self.stopButton.clicked.connect(self.stop_tracking)
         self.layout.addWidget(self.stopButton)
 
-        self.plotButton = QPushButton('Plot Results', self)
+        self.livePlot = None
+        self.plotButton = QPushButton('Show Live Plot', self)
         self.plotButton.clicked.connect(self.plot_results)
         self.layout.addWidget(self.plotButton)
 
@@ -145,21 +171,56 @@ class MainWindow(QWidget):
         self.timer.timeout.connect(self.update_clock)
         self.timer.start(1000)
 
+    def paintEvent(self, event):
+        # No camera here, so the first painted window counts as the first frame
+        mark('first_frame')
+        super().paintEvent(event)
+
     def start_tracking(self):
-        global tracking_active
+        global tracking_active, imu_history
+        if imu_history is None:
+            imu_history = TimeSeries(IMU_HISTORY_PATH)
         tracking_active = True
+        pid1.reset()
+        pid2.reset()
+        if ldr_reader is not None:
+            ldr_reader.set_active(True)
 
     def stop_tracking(self):
         global tracking_active
         tracking_active = False
+        if ldr_reader is not None:
+            ldr_reader.set_active(False)
+        if axis1 is not None:
+            axis1.set_rate(0)
+            axis2.set_rate(0)
         self.calculate_longitude()
 
     def calculate_longitude(self):
-        global longitude
-        if time_of_max_imu_angle:
-            solar_noon_utc = QTime.fromString(time_of_max_imu_angle, 'HH:mm:ss').hour() + QTime.fromString(time_of_max_imu_angle, 'HH:mm:ss').minute() / 60.0
-            longitude = (solar_noon_utc - 12) * 15
-            self.longitudeLabel.setText(f"Longitude: {longitude:.2f} degrees")
+        global longitude, longitude_ci
+        if imu_start is None:
+            return
+        # Parabola fit around the peak instead of the single highest sample
+        t, angle = imu_history.arrays()
+        if not len(t):
+            return
+        # Coarse peak from the downsampled history, then the fit on full-resolution samples around it
+        t_max = t[np.argmax(angle)]
+        transit = estimate_transit(*imu_history.range(t_max - FIT_WINDOW_S, t_max + FIT_WINDOW_S))
+        if transit is None:
+            self.longitudeLabel.setText("Longitude: transit not bracketed yet")
+            return
+        # East positive, with the equation of time applied, like the ephemeris
+        longitude = float(transit_longitude(imu_utc_offset + imu_start + transit.t_peak))
+        longitude_ci = transit.ci / 240.0  # The sun moves 1 degree of longitude every 240 s
+        self.longitudeLabel.setText(self.longitude_text())
+        # Remembered for the feed-forward ephemeris on the next run
+        profile = hardware.unit_profile()
+        profile.update('site', {'longitude': longitude})
+        profile.save()
+
+    def longitude_text(self):
+        return f"Longitude: {longitude:.3f} ± {longitude_ci:.3f} degrees (95%)"
 
     def update_clock(self):
         self.localTimeLabel.setText("Local Time: " + QTime.currentTime().toString('HH:mm:ss'))
@@ -167,53 +228,64 @@ class MainWindow(QWidget):
         self.imuLabel.setText(f'Current IMU Angle: {current_imu_angle:.2f} degrees')
         self.maxImuLabel.setText(f'Highest Recorded IMU Angle: {max_imu_angle:.2f} degrees')
         self.maxTimeLabel.setText(f'Time of Highest IMU Angle: {time_of_max_imu_angle}')
+        if axis1 is not None:
+            self.rateLabel.setText(f'Motor rates: {axis1.rate_now:.0f} / {axis2.rate_now:.0f} steps/s '
+                                   f'(feed-forward {feed_forward[0]:.2f} / {feed_forward[1]:.2f})')
         if longitude is not None:
-            self.longitudeLabel.setText(f"Longitude: {longitude:.2f} degrees")
+            self.longitudeLabel.setText(self.longitude_text())
 
     def plot_results(self):
-        plt.figure()
-        plt.plot(time_history, imu_angle_history, label='IMU Angle')
-        plt.xlabel('Time (s)')
-        plt.ylabel('IMU Angle (degrees)')
-        plt.title('IMU Angle Over Time')
-        plt.legend()
-        plt.show()
+        # Embedded live chart, created on the first press so matplotlib stays off the startup path
+        if imu_history is None:
+            return  # Nothing is recorded before tracking starts
+        if self.livePlot is None:
+            self.livePlot = hardware.lazy_import('live_plot').LivePlot(imu_history, parent=self)
+            self.layout.insertWidget(self.layout.indexOf(self.plotButton), self.livePlot)
+            self.plotButton.setText('Hide Live Plot')
+        else:
+            visible = not self.livePlot.isVisible()
+            self.livePlot.setVisible(visible)
+            if visible:
+                self.livePlot.timer.start()
+            else:
+                self.livePlot.timer.stop()
+            self.plotButton.setText('Hide Live Plot' if visible else 'Show Live Plot')
 
     def quit_application(self):
         QApplication.quit()
 
+def on_imu_burst(burst):
+    # Runs on the IMU reader thread once per FIFO burst
+    global current_imu_angle, max_imu_angle, time_of_max_imu_angle, imu_start, imu_utc_offset
+    if not tracking_active:
+        return
+    # Invert roll to become the IMU angle
+    filtered = imu_filter.update_burst(-burst.roll, -burst.roll_rate, burst.dt)
+    current_imu_angle = float(filtered[-1])
+
+    peak = int(np.argmax(filtered))
+    if filtered[peak] > max_imu_angle:
+        max_imu_angle = float(filtered[peak])
+        peak_offset_ms = int((burst.t[peak] - time.monotonic()) * 1000)
+        time_of_max_imu_angle = QDateTime.currentDateTimeUtc().addMSecs(peak_offset_ms).time().toString('HH:mm:ss')
+    if imu_start is None:
+        imu_start = burst.t[0]
+        imu_utc_offset = time.time() - time.monotonic()
+    imu_history.extend(burst.t - imu_start, filtered)
+
 def update_imu():
-    global current_imu_angle, max_imu_angle, time_of_max_imu_angle, imu_angle_history, time_history, imu_angle_filtered
-    start_time = QDateTime.currentDateTimeUtc()
-    while True:
-        if tracking_active:
-            data = sensor.getMotion6()
-            ax, ay, az = data[3], data[4], data[5]
-            roll = math.atan2(ay, az)
-            roll_deg = math.degrees(roll)
-            current_imu_angle = -roll_deg
-
-            # FIR filter implementation
-            imu_angle_filtered.append(current_imu_angle)
-            if len(imu_angle_filtered) > filter_size:
-                imu_angle_filtered.pop(0)
-            filtered_angle = sum(imu_angle_filtered) / len(imu_angle_filtered)
-
-            if filtered_angle > max_imu_angle:
-                max_imu_angle = filtered_angle
-                time_of_max_imu_angle = QDateTime.currentDateTimeUtc().time().toString('HH:mm:ss')
-            current_time = QDateTime.currentDateTimeUtc()
-            elapsed_time = start_time.secsTo(current_time)
-            imu_angle_history.append(filtered_angle)
-            time_history.append(elapsed_time)
-        sleep(0.5)
+    stream = hardware.imu_stream()
+    print('IMU sensor initialization done')
+    stream.subscribe(on_imu_burst)
 
 app = QApplication(sys.argv)
 window = MainWindow()
 window.show()
+hardware.phase('window')
 
 # Start sensor and LDR threads
 threading.Thread(target=update_imu, daemon=True).start()
 threading.Thread(target=ldr_thread, daemon=True).start()
 
+QTimer.singleShot(0, lambda: mark('interactive'))
 sys.exit(app.exec_())
\ No newline at end of file
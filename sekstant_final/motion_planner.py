@@ -0,0 +1,85 @@
+from functools import lru_cache
+
+import numpy as np
+
+RAMP_SAMPLES = 2000  # Time grid resolution used to invert an S-curve ramp
+
+
+def ramp_profile(v_peak, max_accel, jerk=None):
+    """ Duration and shape of the 0 -> v_peak ramp: (t_jerk, t_const_accel). """
+    if jerk is None:
+        return 0.0, v_peak / max_accel
+    if v_peak >= max_accel ** 2 / jerk:
+        t_j = max_accel / jerk
+        return t_j, (v_peak - max_accel ** 2 / jerk) / max_accel
+    # The ramp is too short to reach full acceleration
+    return (v_peak / jerk) ** 0.5, 0.0
+
+
+def ramp_distance(v_peak, max_accel, jerk=None):
+    t_j, t_c = ramp_profile(v_peak, max_accel, jerk)
+    # A symmetric ramp averages half of its final velocity
+    return v_peak * (2 * t_j + t_c) / 2
+
+
+def peak_velocity(steps, max_velocity, max_accel, jerk=None):
+    """ Highest velocity a move of `steps` can reach and still decelerate in time. """
+    if 2 * ramp_distance(max_velocity, max_accel, jerk) <= steps:
+        return max_velocity
+    if jerk is None:
+        return (max_accel * steps) ** 0.5
+    lo, hi = 0.0, max_velocity
+    for _ in range(50):
+        mid = (lo + hi) / 2
+        if 2 * ramp_distance(mid, max_accel, jerk) <= steps:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def ramp_times(v_peak, max_accel, jerk, positions):
+    """ Time at which the ramp reaches each of `positions` (steps). """
+    t_j, t_c = ramp_profile(v_peak, max_accel, jerk)
+    if jerk is None:
+        return np.sqrt(2 * positions / max_accel)
+    a = jerk * t_j
+    t = np.linspace(0.0, 2 * t_j + t_c, RAMP_SAMPLES)
+    v = np.where(t < t_j, jerk * t ** 2 / 2,
+                 np.where(t < t_j + t_c, jerk * t_j ** 2 / 2 + a * (t - t_j),
+                          v_peak - jerk * (2 * t_j + t_c - t) ** 2 / 2))
+    s = np.concatenate(([0.0], np.cumsum((v[1:] + v[:-1]) / 2 * np.diff(t))))
+    return np.interp(positions, s, t)
+
+
+@lru_cache(maxsize=64)
+def plan_move(steps, max_velocity, max_accel, jerk=None):
+    """
+    Per-step intervals (us) for a move with accel, cruise and decel phases.
+
+    Trapezoidal when jerk is None, S-curve otherwise. Results are cached, so
+    repeated moves of the same length reuse the same table.
+    """
+    steps = int(steps)
+    if steps <= 0:
+        return ()
+    v = peak_velocity(steps, max_velocity, max_accel, jerk)
+    d_ramp = min(ramp_distance(v, max_accel, jerk), steps / 2)
+    t_j, t_c = ramp_profile(v, max_accel, jerk)
+    t_ramp = 2 * t_j + t_c
+    cruise = steps - 2 * d_ramp
+    total = 2 * t_ramp + cruise / v
+
+    # Each step fires at the middle of its position slot so both ramps mirror
+    k = np.arange(steps) + 0.5
+    times = np.empty(steps)
+    accel = k <= d_ramp
+    decel = k > steps - d_ramp
+    mid = ~(accel | decel)
+    times[accel] = ramp_times(v, max_accel, jerk, k[accel])
+    times[mid] = t_ramp + (k[mid] - d_ramp) / v
+    times[decel] = total - ramp_times(v, max_accel, jerk, steps - k[decel])
+
+    # Round the absolute step times so interval rounding does not accumulate
+    stamps = np.round(np.append(times, total) * 1e6).astype(np.int64)
+    return tuple(int(i) for i in np.diff(stamps))
@@ -0,0 +1,80 @@
+import threading
+from collections import deque
+
+from stepper_wave import constant_intervals
+
+REPLACE, MERGE = 'replace', 'merge'
+
+
+class AxisWorker:
+    """
+    Long-lived worker that executes step corrections for one axis.
+
+    At most one correction waits behind the running move. A newer one
+    replaces it (or is merged into it), so stale corrections never pile up;
+    `replaced` and `merged` count how often that happened.
+    """
+
+    def __init__(self, stepper, dir_pin, step_pin, delay, enabled=None, policy=REPLACE):
+        self.stepper = stepper
+        self.dir_pin = dir_pin
+        self.step_pin = step_pin
+        self.delay = delay
+        self.enabled = enabled or (lambda: True)
+        self.policy = policy
+        self.pending = deque()
+        self.cond = threading.Condition()
+        self.submitted = 0
+        self.executed = 0
+        self.replaced = 0
+        self.merged = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.steps_done = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, direction, steps):
+        steps = abs(int(steps))
+        with self.cond:
+            self.submitted += 1
+            if self.pending and self.policy == REPLACE:
+                self.replaced += len(self.pending)
+                self.pending.clear()
+            elif self.pending and self.policy == MERGE:
+                old_direction, old_steps = self.pending.pop()
+                self.merged += 1
+                if old_direction == direction:
+                    steps += old_steps
+                elif old_steps > steps:
+                    direction, steps = old_direction, old_steps - steps
+                else:
+                    steps -= old_steps
+            self.pending.append((direction, steps))
+            self.max_depth = max(self.max_depth, len(self.pending))
+            self.cond.notify()
+
+    def clear(self):
+        with self.cond:
+            self.dropped += len(self.pending)
+            self.pending.clear()
+
+    def stats(self):
+        with self.cond:
+            return {'queue_depth': len(self.pending), 'max_depth': self.max_depth,
+                    'submitted': self.submitted, 'executed': self.executed,
+                    'replaced': self.replaced, 'merged': self.merged, 'dropped': self.dropped, 'steps': self.steps_done}
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                direction, steps = self.pending.popleft()
+            if steps == 0 or not self.enabled():
+                continue
+            move = self.stepper.queue_move(self.dir_pin, self.step_pin, direction,
+                                           constant_intervals(steps, self.delay))
+            move.wait()
+            with self.cond:
+                self.executed += 1
+                self.steps_done += move.steps
@@ -0,0 +1,112 @@
+import math
+import time
+
+SETTLE_BAND = 0.05     # Settled once |error| stays within this fraction of the initial error
+SETTLE_HOLD = 0.0      # ... for at least this many seconds before stats() is taken
+MAX_DT_FACTOR = 4      # Longer gaps (tracking paused, port stalled) integrate as this many periods
+HOLD_FRACTION = 0.5    # Calls sooner than this fraction of dt after the last update return the held output
+
+
+class PID:
+    """
+    PID controller for one axis, run at a fixed rate.
+
+    The output is clamped to +-limit, and the integral uses back-calculation:
+    whatever the clamp cuts off is fed back into the integral with the
+    tracking time constant, so it does not wind up while saturated. The
+    derivative acts on the error through a first-order low-pass with time
+    constant tau. Calls arriving much faster than dt return the held
+    output; the others integrate over the measured interval, so jitter in
+    the sample stream does not change the effective gains.
+
+    Overshoot, settling time and output reversals since the last reset()
+    are kept in `stats()`; errors within `noise` of zero count as settled,
+    and a settling time is only reported once the error has stayed in the
+    band for `settle_hold` seconds.
+    """
+
+    def __init__(self, kp, ki=0.0, kd=0.0, dt=0.05, limit=None, tau=None, tracking=None, settle_band=SETTLE_BAND,
+                 settle_hold=SETTLE_HOLD, noise=0.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.dt = dt
+        self.limit = limit
+        self.tau = 2 * dt if tau is None else tau
+        if tracking is None:
+            # Geometric mean of the integral and derivative times, the usual rule of thumb
+            ti = kp / ki if ki and kp else dt * 10
+            td = kd / kp if kd and kp else 0.0
+            tracking = math.sqrt(ti * td) if td else ti
+        self.tracking = max(tracking, dt)
+        self.settle_band = settle_band
+        self.settle_hold = settle_hold
+        self.noise = noise
+        self.reset()
+
+    def reset(self):
+        """ Clear the controller state and start a new settling measurement. """
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.prev_error = None
+        self.output = 0.0
+        self.last_time = None
+        self.start_time = None
+        self.initial_error = None
+        self.peak_overshoot = 0.0
+        self.last_outside = None
+        self.reversals = 0
+        self.saturated = 0
+        self.updates = 0
+
+    def due(self, now=None):
+        """ Whether update() would compute a new output rather than hold the last one. """
+        now = time.monotonic() if now is None else now
+        return self.last_time is None or now - self.last_time >= HOLD_FRACTION * self.dt
+
+    def update(self, error, now=None):
+        """ Controller output for the latest error, at the rate set by dt. """
+        now = time.monotonic() if now is None else now
+        if not self.due(now):
+            return self.output
+        dt = self.dt if self.last_time is None else min(now - self.last_time, MAX_DT_FACTOR * self.dt)
+        self.last_time = now
+
+        if self.prev_error is not None:
+            self.derivative += (self.kd * (error - self.prev_error) / dt - self.derivative) * dt / (self.tau + dt)
+        self.prev_error = error
+        unclamped = self.kp * error + self.integral + self.derivative
+        output = unclamped
+        if self.limit is not None:
+            output = max(-self.limit, min(self.limit, unclamped))
+        self.integral += (self.ki * error + (output - unclamped) / self.tracking) * dt
+
+        if output != unclamped:
+            self.saturated += 1
+        if output * self.output < 0:
+            self.reversals += 1
+        self.output = output
+        self.updates += 1
+        self._track_response(error, now)
+        return output
+
+    def _track_response(self, error, now):
+        if self.initial_error is None:
+            if error == 0:
+                return
+            self.initial_error, self.start_time = error, now
+        scale = abs(self.initial_error)
+        # Overshoot: how far the error crossed zero beyond the noise, relative to where it started
+        crossed = -error * math.copysign(1, self.initial_error) - self.noise
+        self.peak_overshoot = max(self.peak_overshoot, crossed / scale)
+        if abs(error) > max(self.settle_band * scale, self.noise):
+            self.last_outside = now
+
+    def stats(self):
+        settling = None
+        if self.start_time is not None and self.last_outside is not None:
+            held = self.last_time - self.last_outside
+            if held > 0 and held >= self.settle_hold:
+                settling = self.last_outside - self.start_time
+        return {'settling_time': settling, 'overshoot': self.peak_overshoot, 'reversals': self.reversals,
+                'saturated_fraction': self.saturated / self.updates if self.updates else 0.0}
@@ -0,0 +1,51 @@
+import mmap
+import os
+import struct
+import threading
+
+DEFAULT_PATH = os.path.expanduser('~/.sekstant/positions.bin')
+SIM_PATH = os.path.expanduser('~/.sekstant/sim-positions.bin')
+
+# One fixed-size record per BCM pin: signed position, update count
+RECORD = struct.Struct('<qQ')
+SLOTS = 32
+
+
+class PositionJournal:
+    """
+    Per-axis step positions kept in a small memory-mapped file.
+
+    Updates are plain stores into the mapping (no fsync per step), so they
+    are cheap enough to make on every credited step and survive the
+    process exiting. Positions count +1 for each step taken with DIR high.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < RECORD.size * SLOTS:
+                os.ftruncate(fd, RECORD.size * SLOTS)
+            self.map = mmap.mmap(fd, RECORD.size * SLOTS)
+        finally:
+            os.close(fd)
+        self.lock = threading.Lock()
+
+    def __getitem__(self, step_pin):
+        return RECORD.unpack_from(self.map, step_pin * RECORD.size)[0]
+
+    def set(self, step_pin, position):
+        with self.lock:
+            _, writes = RECORD.unpack_from(self.map, step_pin * RECORD.size)
+            RECORD.pack_into(self.map, step_pin * RECORD.size, int(position), writes + 1)
+
+    def add(self, step_pin, delta):
+        with self.lock:
+            position, writes = RECORD.unpack_from(self.map, step_pin * RECORD.size)
+            position += int(delta)
+            RECORD.pack_into(self.map, step_pin * RECORD.size, position, writes + 1)
+            return position
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
@@ -1,12 +1,24 @@
+import os
 import sys
+import time
 import subprocess
 from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout
+from zygote import Zygote, LAUNCH_ENV
+
+# Forked launcher with the heavy modules pre-imported (--no-zygote to disable)
+zygote = None
+# Flags for the tools themselves (--sim, --kalman, --startup-profile, ...) are passed on to every launch
+TOOL_ARGS = [arg for arg in sys.argv[1:] if arg != '--no-zygote']
 
 def run_script(script_path):
-    """ Run the given Python script by spawning a new process. """
+    """ Run the given Python script in a child forked from the zygote, or a new process as fallback. """
     try:
-        subprocess.Popen(['python3', script_path])
-        print(f"Running: {script_path}")
+        if zygote is not None and script_path.endswith('.py'):
+            pid = zygote.launch(script_path, TOOL_ARGS)
+        else:
+            env = dict(os.environ, **{LAUNCH_ENV: repr(time.monotonic())})
+            pid = subprocess.Popen(['python3', script_path] + TOOL_ARGS, env=env).pid
+        print(f"Running: {script_path} (pid {pid})")
     except Exception as e:
         print(f"Failed to start {script_path}: {str(e)}")
 
@@ -49,6 +61,12 @@ class App(QWidget):
         self.setGeometry(300, 300, 250, 150)  # Set window position and size
 
 if __name__ == '__main__':
+    # Tools launched from here inherit simulated hardware through the environment
+    if '--sim' in sys.argv:
+        os.environ['SEKSTANT_SIM'] = '1'
+    # The zygote has to fork before QApplication exists
+    if '--no-zygote' not in sys.argv:
+        zygote = Zygote()
     app = QApplication(sys.argv)
     ex = App()
     ex.show()
@@ -0,0 +1,141 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hardware
+
+# Step/dir pins per axis, as wired in every tool
+AXES = {1: (20, 21), 2: (8, 7)}
+
+REF_RATE = 100           # steps/s, slow enough never to miss a step; calibrates degrees per step
+REF_STEPS = 300
+TEST_ACCEL = 1000        # steps/s^2 while searching for the maximum rate
+START_RATE = 200         # steps/s, first level of the rate search
+START_ACCEL = 500        # steps/s^2, first level of the acceleration search
+GROWTH = 1.25            # Each level is this much above the last
+MAX_TEST_RATE = 5000
+MAX_TEST_ACCEL = 50000
+HOLD_S = 0.5             # Time at the test rate per level
+SETTLE_S = 0.3           # Wait after each segment for the frame to stop swinging
+TRACK_RATIO = 0.95       # Observed / commanded motion below this counts as missed steps
+SAFETY = 0.8             # Stored limits are this fraction of the highest level that passed
+
+# Which IMU rate sees each axis turn (see imu_fifo.Burst)
+IMU_RATE = {1: 'roll_rate', 2: 'tilt_rate'}
+
+
+class MotionObserver:
+    """ Integrates the IMU gyro rate of each axis into an observed angle, burst by burst. """
+
+    def __init__(self, stream):
+        self.angle = {axis: 0.0 for axis in AXES}
+        self.lock = threading.Lock()
+        stream.subscribe(self._on_burst)
+
+    def _on_burst(self, burst):
+        with self.lock:
+            for axis, name in IMU_RATE.items():
+                self.angle[axis] += float(getattr(burst, name).sum()) * burst.dt
+
+    def read(self, axis):
+        with self.lock:
+            return self.angle[axis]
+
+
+def segment(stepper, observer, axis, rate, accel, hold_s):
+    """
+    Ramp axis to `rate` at `accel`, hold it, ramp down. Returns
+    (commanded steps, observed degrees) over the segment.
+    """
+    dir_pin, step_pin = AXES[axis]
+    move = stepper.queue_velocity(dir_pin, step_pin, accel)
+    start = observer.read(axis)
+    move.set_rate(rate)
+    time.sleep(abs(rate) / accel + hold_s)
+    move.set_rate(0)
+    time.sleep(abs(rate) / accel + 0.05)
+    while move.rate_now != 0:
+        time.sleep(0.01)
+    stepper.stop(step_pin)
+    time.sleep(SETTLE_S)
+    return move.position, observer.read(axis) - start
+
+
+def tracked(stepper, observer, axis, deg_per_step, rate, accel, hold_s=HOLD_S):
+    """ Fraction of the commanded motion the IMU saw, out and back, for one rate/acceleration level. """
+    worst = 1.0
+    for direction in (1, -1):
+        steps, degrees = segment(stepper, observer, axis, direction * rate, accel, hold_s)
+        if steps:
+            worst = min(worst, degrees / deg_per_step / steps)
+    return worst
+
+
+def calibrate_axis(stepper, observer, axis):
+    """ Degrees per step, then the highest rate and acceleration whose motion the IMU fully sees. """
+    steps, degrees = segment(stepper, observer, axis, REF_RATE, TEST_ACCEL, REF_STEPS / REF_RATE)
+    segment(stepper, observer, axis, -REF_RATE, TEST_ACCEL, REF_STEPS / REF_RATE)
+    if not steps or abs(degrees) < 1e-3 * abs(steps):
+        raise RuntimeError(f'axis {axis}: the IMU saw no motion; is it mounted on the moving frame?')
+    deg_per_step = degrees / steps
+    print(f"axis {axis}: {deg_per_step:.5f} deg/step")
+
+    max_rate, rate = None, START_RATE
+    while rate <= MAX_TEST_RATE:
+        ratio = tracked(stepper, observer, axis, deg_per_step, rate, TEST_ACCEL)
+        print(f"axis {axis}: {rate:7.0f} steps/s   tracked {ratio * 100:5.1f}%")
+        if ratio < TRACK_RATIO:
+            break
+        max_rate, rate = rate, rate * GROWTH
+    if max_rate is None:
+        raise RuntimeError(f'axis {axis}: missed steps already at {START_RATE} steps/s')
+
+    cruise = max_rate * SAFETY
+    max_accel, accel = None, START_ACCEL
+    while accel <= MAX_TEST_ACCEL:
+        ratio = tracked(stepper, observer, axis, deg_per_step, cruise, accel, hold_s=0.1)
+        print(f"axis {axis}: {accel:7.0f} steps/s^2 tracked {ratio * 100:5.1f}%")
+        if ratio < TRACK_RATIO:
+            break
+        max_accel, accel = accel, accel * GROWTH
+    if max_accel is None:
+        raise RuntimeError(f'axis {axis}: missed steps already at {START_ACCEL} steps/s^2')
+    return {'max_rate': round(max_rate * SAFETY), 'max_accel': round(max_accel * SAFETY),
+            'deg_per_step': deg_per_step, 'tested': time.strftime('%Y-%m-%d %H:%M')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the highest step rate and acceleration each axis follows '
+                                                 'without missing steps, using the IMU, and store them in the unit profile.')
+    parser.add_argument('--axis', type=int, choices=sorted(AXES), nargs='+', default=sorted(AXES))
+    parser.add_argument('--dry-run', action='store_true', help='do not write the profile')
+    parser.add_argument('--sim', action='store_true', help='use the simulated hardware')
+    args = parser.parse_args()
+
+    print("Both axes will swing back and forth; keep the travel clear.")
+    stepper = hardware.stepper()
+    observer = MotionObserver(hardware.imu_stream())
+    results = {}
+    try:
+        for axis in args.axis:
+            try:
+                results[axis] = calibrate_axis(stepper, observer, axis)
+                print(f"axis {axis}: max {results[axis]['max_rate']} steps/s, {results[axis]['max_accel']} steps/s^2")
+            except RuntimeError as e:
+                print(e)
+        if results and not args.dry_run:
+            profile = hardware.unit_profile()
+            for axis, entry in results.items():
+                profile.set_motion(axis, entry)
+            profile.save()
+            print(f"Saved motion limits for axis {', '.join(map(str, results))} to {profile.path}")
+    finally:
+        hardware.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import sys
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+# Complementary filter by default, the two-state Kalman filter with --kalman
+MODE = 'kalman' if '--kalman' in sys.argv else 'complementary'
+
+TAU = 0.5  # s, crossover: gyro wins on faster changes, accelerometer on slower ones
+
+
+class AngleFilter(ABC):
+    """ Base for filters that fuse an accelerometer angle with a gyro rate, one sample per update(). """
+
+    @abstractmethod
+    def update(self, accel_angle, rate, dt):
+        """ Fuse one sample taken dt seconds after the last; returns the angle. """
+
+    def update_burst(self, accel_angles, rates, dt):
+        """ Filter a burst sampled every dt seconds; returns one angle per sample. """
+        out = np.empty(len(accel_angles))
+        for i, (accel_angle, rate) in enumerate(zip(accel_angles.tolist(), rates.tolist())):
+            out[i] = self.update(accel_angle, rate, dt)
+        return out
+
+
+class ComplementaryFilter(AngleFilter):
+    """ Integrates the gyro rate and pulls the result towards the accelerometer angle with time constant `tau`. """
+
+    def __init__(self, tau=TAU):
+        self.tau = tau
+        self.angle = None
+
+    def update(self, accel_angle, rate, dt):
+        if self.angle is None or dt <= 0:
+            self.angle = accel_angle
+            return self.angle
+        alpha = self.tau / (self.tau + dt)
+        self.angle = alpha * (self.angle + rate * dt) + (1 - alpha) * accel_angle
+        return self.angle
+
+
+class KalmanFilter(AngleFilter):
+    """ Angle and gyro bias estimated together; the accelerometer angle is the measurement. """
+
+    def __init__(self, q_angle=0.001, q_bias=0.003, r_measure=0.03):
+        self.q_angle = q_angle
+        self.q_bias = q_bias
+        self.r_measure = r_measure
+        self.angle = None
+        self.bias = 0.0
+        self.p = [[0.0, 0.0], [0.0, 0.0]]
+
+    def update(self, accel_angle, rate, dt):
+        if self.angle is None or dt <= 0:
+            self.angle = accel_angle
+            return self.angle
+        p = self.p
+        # Predict
+        self.angle += (rate - self.bias) * dt
+        p[0][0] += dt * (dt * p[1][1] - p[0][1] - p[1][0] + self.q_angle)
+        p[0][1] -= dt * p[1][1]
+        p[1][0] -= dt * p[1][1]
+        p[1][1] += self.q_bias * dt
+        # Correct with the accelerometer angle
+        s = p[0][0] + self.r_measure
+        k0, k1 = p[0][0] / s, p[1][0] / s
+        innovation = accel_angle - self.angle
+        self.angle += k0 * innovation
+        self.bias += k1 * innovation
+        p00, p01 = p[0][0], p[0][1]
+        p[0][0] -= k0 * p00
+        p[0][1] -= k0 * p01
+        p[1][0] -= k1 * p00
+        p[1][1] -= k1 * p01
+        return self.angle
+
+
+def make_filter(mode=None):
+    return KalmanFilter() if (mode or MODE) == 'kalman' else ComplementaryFilter()
+
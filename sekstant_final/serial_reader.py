@@ -0,0 +1,98 @@
+import os
+import select
+import time
+from collections import deque
+
+LATENCY_HISTORY = 256   # Recent input-to-actuation latencies kept for stats()
+
+
+class SerialReader:
+    """
+    Serial reader that sleeps in select() on the port's file descriptor.
+
+    The thread wakes only when bytes arrive or set_active()/close() is
+    called. While inactive the port is not watched at all, and anything
+    that arrived meanwhile is discarded on reactivation so stale readings
+    never reach the controller. Reactivations are counted, so one that
+    happens between two wakeups (off and on again) still discards.
+    """
+
+    def __init__(self, ser, active=True):
+        self.ser = ser
+        self.active = active
+        self.activations = 0
+        self.closed = False
+        self.wake_r, self.wake_w = os.pipe()
+        self.buffer = bytearray()
+        self.wakeups = 0
+        self.lines_read = 0
+        self.bytes_read = 0
+        self.cpu_time = 0.0
+        self.read_time = None
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+
+    def set_active(self, active):
+        if active and not self.active:
+            self.activations += 1
+        self.active = active
+        if not self.closed:
+            os.write(self.wake_w, b'a')
+
+    def close(self):
+        self.closed = True
+        os.write(self.wake_w, b'c')
+
+    def actuated(self):
+        """ Record that the controller has acted on everything read so far. """
+        if self.read_time is not None:
+            self.latencies.append(time.monotonic() - self.read_time)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {'wakeups': self.wakeups, 'lines': self.lines_read, 'bytes': self.bytes_read,
+                'cpu_time': self.cpu_time,
+                'latency_ms_p50': latencies[len(latencies) // 2] * 1e3 if latencies else None,
+                'latency_ms_max': latencies[-1] * 1e3 if latencies else None}
+
+    def chunks(self):
+        """
+        Yield raw bytes as they arrive, for as long as the reader is open.
+
+        None is yielded when input was discarded on reactivation, so a
+        consumer holding a partial frame knows to drop it.
+        """
+        fd = self.ser.fileno()
+        seen = self.activations
+        cpu_start = time.thread_time()
+        while not self.closed:
+            watch = [self.wake_r, fd] if self.active else [self.wake_r]
+            self.cpu_time = time.thread_time() - cpu_start
+            ready = select.select(watch, [], [])[0]
+            self.wakeups += 1
+            if self.wake_r in ready:
+                os.read(self.wake_r, 64)
+                if self.active and self.activations != seen:
+                    self.ser.reset_input_buffer()
+                    yield None
+                seen = self.activations
+                continue
+            # Drain the whole backlog so the consumer always sees the newest sample
+            self.read_time = time.monotonic()
+            data = self.ser.read(self.ser.in_waiting or 1)
+            self.bytes_read += len(data)
+            yield data
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+    def lines(self):
+        """ Yield decoded, stripped lines as they arrive, for as long as the reader is open. """
+        for data in self.chunks():
+            if data is None:
+                self.buffer.clear()
+                continue
+            self.buffer += data
+            *complete, rest = self.buffer.split(b'\n')
+            self.buffer = bytearray(rest)
+            for line in complete:
+                self.lines_read += 1
+                yield line.decode('utf-8', errors='replace').strip()
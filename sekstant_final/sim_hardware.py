@@ -0,0 +1,570 @@
+import fcntl
+import math
+import os
+import random
+import select
+import struct
+import sys
+import termios
+import threading
+import time
+import types
+from collections import deque
+
+import ldr_protocol
+
+# Step/dir pairs of the two axes (BCM), as wired in every tool
+AXIS_PINS = {21: 20, 7: 8}
+STEPS_PER_DEGREE = 60
+
+# Simulated time runs this much faster for the sun only, so tracking is visible in minutes
+SUN_SPEEDUP = 60
+SUN_DEG_PER_S = 15 / 3600 * SUN_SPEEDUP
+
+MECH_TAU = 0.05          # s, lag between the step count and the frame angle the IMU sees
+IMU_NOISE_G = 0.003
+GYRO_NOISE_DPS = 0.1
+LDR_RATE_HZ = 20
+LDR_GAIN = 1500          # counts per unit sin(error) across one LDR pair
+LDR_NOISE = 8
+CAMERA_FPS = 30
+STALL_RATE = 1500        # steps/s above which the simulated motors miss steps
+STALL_ACCEL = 8000       # steps/s^2 of rate change between consecutive steps they can follow
+PULL_IN_RATE = 250       # steps/s they can start at from standstill
+PULSE_HISTORY = 100000   # rising edges kept per pin
+COMPASS_HEADING = 40.0   # degrees, compass heading with axis 2 at its zero position
+
+WAVE_MODE_ONE_SHOT, WAVE_MODE_REPEAT, WAVE_MODE_ONE_SHOT_SYNC, WAVE_MODE_REPEAT_SYNC = 0, 1, 2, 3
+NO_TX_WAVE = 9999
+INPUT, OUTPUT = 0, 1
+
+
+class pulse:
+    """ Same fields as pigpio.pulse. """
+
+    def __init__(self, gpio_on, gpio_off, delay):
+        self.gpio_on = gpio_on
+        self.gpio_off = gpio_off
+        self.delay = delay
+
+
+class GPIOBank:
+    """
+    Pin levels shared by the simulated pigpio and RPi.GPIO.
+
+    Every rising edge on a step pin is timestamped into `pulses[pin]` and
+    moves the axis one step, +1 with its DIR pin high, unless it comes too
+    fast (STALL_RATE) or too abruptly (STALL_ACCEL) for the motor; those
+    steps are counted in `missed` instead.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.levels = {}
+        self.modes = {}
+        self.pulses = {}
+        self.positions = {step_pin: 0 for step_pin in AXIS_PINS}
+        self.missed = {step_pin: 0 for step_pin in AXIS_PINS}
+        self.step_rate_now = {step_pin: 0.0 for step_pin in AXIS_PINS}
+        self.servo = {}
+
+    def write(self, pin, level, at=None):
+        at = time.monotonic() if at is None else at
+        with self.lock:
+            self._write(pin, 1 if level else 0, at)
+
+    def write_masks(self, on_mask, off_mask, at):
+        with self.lock:
+            for pin in range(32):
+                if on_mask >> pin & 1:
+                    self._write(pin, 1, at)
+                elif off_mask >> pin & 1:
+                    self._write(pin, 0, at)
+
+    def _write(self, pin, level, at):
+        rising = level and not self.levels.get(pin, 0)
+        self.levels[pin] = level
+        if rising:
+            pulses = self.pulses.setdefault(pin, deque(maxlen=PULSE_HISTORY))
+            if pin in AXIS_PINS:
+                interval = at - pulses[-1] if pulses else float('inf')
+                rate = 1 / interval if interval > 0 else float('inf')
+                accel = (rate - self.step_rate_now[pin]) * rate  # Rate change over this one step interval
+                self.step_rate_now[pin] = rate
+                if rate > STALL_RATE or (rate > PULL_IN_RATE and accel > STALL_ACCEL):
+                    self.missed[pin] += 1
+                else:
+                    self.positions[pin] += 1 if self.levels.get(AXIS_PINS[pin], 0) else -1
+            pulses.append(at)
+
+    def read(self, pin):
+        return self.levels.get(pin, 0)
+
+    def angle(self, step_pin):
+        return self.positions[step_pin] / STEPS_PER_DEGREE
+
+    def step_rate(self, step_pin, window=0.5):
+        """ Steps per second over the last `window` seconds. """
+        now = time.monotonic()
+        times = self.pulses.get(step_pin, ())
+        return sum(1 for t in reversed(times) if t > now - window) / window if times else 0.0
+
+
+class World:
+    """ Motion model: frame angles follow the step counts, the sun drifts across the sky. """
+
+    def __init__(self, bank):
+        self.bank = bank
+        self.t0 = time.monotonic()
+        self.tilt = {step_pin: 0.0 for step_pin in AXIS_PINS}
+        self.tilt_rate = {step_pin: 0.0 for step_pin in AXIS_PINS}
+        self.updated = self.t0
+        self.lock = threading.Lock()
+        self.sun_offset = (5.0, -3.0)
+
+    def update(self):
+        """ Advance the first-order mechanical lag to now. """
+        with self.lock:
+            now = time.monotonic()
+            dt = now - self.updated
+            self.updated = now
+            k = 1 - math.exp(-dt / MECH_TAU) if dt > 0 else 0.0
+            for step_pin in AXIS_PINS:
+                target = self.bank.angle(step_pin)
+                new = self.tilt[step_pin] + (target - self.tilt[step_pin]) * k
+                self.tilt_rate[step_pin] = (new - self.tilt[step_pin]) / dt if dt > 0 else 0.0
+                self.tilt[step_pin] = new
+            return dict(self.tilt), dict(self.tilt_rate)
+
+    def sun(self):
+        """ Sun angles (degrees) along the two axes. """
+        elapsed = time.monotonic() - self.t0
+        return self.sun_offset[0] + SUN_DEG_PER_S * elapsed, self.sun_offset[1]
+
+    def tracking_error(self):
+        tilt, _ = self.update()
+        sun1, sun2 = self.sun()
+        step1, step2 = AXIS_PINS
+        return sun1 - tilt[step1], sun2 - tilt[step2]
+
+
+bank = GPIOBank()
+world = World(bank)
+
+
+class Pi:
+    """
+    pigpio.pi stand-in. Waveforms play back on a thread in real time, with
+    each edge stamped at its exact scheduled time.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.connected = True
+        self.building = []
+        self.waves = {}
+        self.next_wid = 0
+        self.queue = deque()
+        self.on_air = None
+        self.cond = threading.Condition()
+        threading.Thread(target=self._play, daemon=True).start()
+
+    def set_mode(self, gpio, mode):
+        bank.modes[gpio] = mode
+
+    def write(self, gpio, level):
+        bank.write(gpio, level)
+
+    def read(self, gpio):
+        return bank.read(gpio)
+
+    def set_servo_pulsewidth(self, gpio, pulsewidth):
+        bank.servo[gpio] = pulsewidth
+
+    def callback(self, gpio, edge=0, func=None):
+        return types.SimpleNamespace(cancel=lambda: None)
+
+    def stop(self):
+        self.wave_tx_stop()
+        self.connected = False
+
+    def wave_add_new(self):
+        self.building = []
+
+    def wave_add_generic(self, pulses):
+        self.building.extend(pulses)
+        return len(self.building)
+
+    def wave_create(self):
+        with self.cond:
+            wid = self.next_wid
+            self.next_wid += 1
+            self.waves[wid] = self.building
+            self.building = []
+            return wid
+
+    def wave_delete(self, wid):
+        with self.cond:
+            self.waves.pop(wid, None)
+
+    def wave_clear(self):
+        with self.cond:
+            self.wave_tx_stop()
+            self.waves.clear()
+
+    def wave_send_using_mode(self, wid, mode):
+        with self.cond:
+            if mode in (WAVE_MODE_ONE_SHOT, WAVE_MODE_REPEAT):
+                self._cut()
+            self.queue.append(wid)
+            self.cond.notify()
+
+    def wave_send_once(self, wid):
+        self.wave_send_using_mode(wid, WAVE_MODE_ONE_SHOT)
+
+    def wave_tx_busy(self):
+        with self.cond:
+            return int(self.on_air is not None or bool(self.queue))
+
+    def wave_tx_at(self):
+        with self.cond:
+            if self.on_air is not None:
+                return self.on_air
+            # Between two SYNC waves the next one counts as on air already
+            return self.queue[0] if self.queue else NO_TX_WAVE
+
+    def wave_tx_stop(self):
+        with self.cond:
+            self._cut()
+
+    def _cut(self):
+        self.queue.clear()
+        self.on_air = None
+        self.cond.notify_all()
+
+    def _play(self):
+        start = None
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.on_air, start = None, None
+                    self.cond.wait()
+                wid = self.queue.popleft()
+                self.on_air = wid
+                pulses = self.waves.get(wid, [])
+            # A SYNC wave starts exactly where the previous one ended
+            start = time.monotonic() if start is None else start
+            t = start
+            for p in pulses:
+                with self.cond:
+                    if self.on_air != wid:
+                        start = None
+                        break
+                bank.write_masks(p.gpio_on, p.gpio_off, t)
+                t += p.delay / 1e6
+                ahead = t - time.monotonic()
+                if ahead > 0.001:
+                    time.sleep(ahead)
+            else:
+                ahead = t - time.monotonic()
+                if ahead > 0:
+                    time.sleep(ahead)
+                start = t
+            with self.cond:
+                if self.on_air == wid:
+                    self.on_air = None
+
+
+class GPIO(types.ModuleType):
+    """ RPi.GPIO stand-in writing to the shared pin bank. """
+    BCM, BOARD = 11, 10
+    OUT, IN = 0, 1
+    HIGH, LOW = 1, 0
+    PUD_UP, PUD_DOWN, PUD_OFF = 22, 21, 20
+
+    def __init__(self):
+        super().__init__('RPi.GPIO')
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=None, initial=None):
+        for pin in channel if isinstance(channel, (list, tuple)) else (channel,):
+            bank.modes[pin] = direction
+            if initial is not None:
+                bank.write(pin, initial)
+
+    def output(self, channel, value):
+        pins = channel if isinstance(channel, (list, tuple)) else (channel,)
+        values = value if isinstance(value, (list, tuple)) else [value] * len(pins)
+        now = time.monotonic()
+        for pin, level in zip(pins, values):
+            bank.write(pin, level, now)
+
+    def input(self, channel):
+        return bank.read(channel)
+
+    def cleanup(self, channel=None):
+        pass
+
+
+class IMU:
+    """ BMI160_i2c.Driver stand-in; the roll it reports is the lagged axis 1 angle plus noise. """
+    ACCEL_LSB = 16384    # per g at +-2 g
+
+    def __init__(self, address=0x69, gyro_lsb=131.2):
+        # Driver() leaves the gyro at +-250 deg/s; the FIFO service sets +-2000 (16.4 LSB)
+        self.address = address
+        self.gyro_lsb = gyro_lsb
+
+    def getMotion6(self):
+        tilt, rate = world.update()
+        step1, step2 = AXIS_PINS
+        roll = math.radians(-tilt[step1])
+        yaw = math.radians(tilt[step2])
+        ax = math.sin(yaw) * math.cos(roll) + random.gauss(0, IMU_NOISE_G)
+        ay = math.sin(roll) + random.gauss(0, IMU_NOISE_G)
+        az = math.cos(roll) * math.cos(yaw) + random.gauss(0, IMU_NOISE_G)
+        # Roll turns about x (roll rate = gx), tilt about y (tilt rate = -gy)
+        gx = -rate[step1] * self.gyro_lsb
+        gy = -rate[step2] * self.gyro_lsb
+        return (int(gx), int(gy), 0, int(ax * self.ACCEL_LSB), int(ay * self.ACCEL_LSB), int(az * self.ACCEL_LSB))
+
+    def getAcceleration(self):
+        return self.getMotion6()[3:6]
+
+    def getRotation(self):
+        return self.getMotion6()[0:3]
+
+
+class BMI160Bus:
+    """
+    Register-level BMI160 for imu_fifo: the FIFO fills with headerless
+    gyro+accel frames at the configured ODR, sampled from the motion model.
+    """
+    FIFO_SIZE = 1024
+
+    def __init__(self, bus=1):
+        self.registers = {}
+        self.fifo = bytearray()
+        self.filled_to = time.monotonic()
+
+    def write_byte(self, address, register, value):
+        self.registers[register] = value
+        if register == 0x7E and value == 0xB0:
+            self.fifo.clear()
+            self.filled_to = time.monotonic()
+
+    def _odr(self):
+        return 100 * 2 ** ((self.registers.get(0x40, 0x08) & 0x0F) - 8)
+
+    def _fill(self):
+        now = time.monotonic()
+        period = 1.0 / self._odr()
+        count = int((now - self.filled_to) / period)
+        if count <= 0 or not self.registers.get(0x47):
+            return
+        self.filled_to += count * period
+        frame = IMU(gyro_lsb=16.4).getMotion6()
+        noise = [GYRO_NOISE_DPS * 16.4] * 3 + [IMU_NOISE_G * IMU.ACCEL_LSB] * 3
+        for _ in range(min(count, self.FIFO_SIZE // 12)):
+            noisy = [int(v + random.gauss(0, sigma)) for v, sigma in zip(frame, noise)]
+            self.fifo += struct.pack('<6h', *noisy)
+        # A full FIFO keeps the newest frames
+        del self.fifo[:max(0, len(self.fifo) - self.FIFO_SIZE // 12 * 12)]
+
+    def read_block(self, address, register, length):
+        if register == 0x22:
+            self._fill()
+            return bytes([len(self.fifo) & 0xFF, len(self.fifo) >> 8])[:length]
+        if register == 0x24:
+            data = bytes(self.fifo[:length])
+            del self.fifo[:length]
+            return data
+        return bytes(self.registers.get(register + i, 0) for i in range(length))
+
+    def close(self):
+        pass
+
+
+class SerialException(Exception):
+    pass
+
+
+class LDRSerial:
+    """
+    serial.Serial stand-in streaming LDR readings at LDR_RATE_HZ.
+
+    Each pair is unbalanced by the tracking error on its axis. Readings are
+    sent as binary ldr_protocol frames, or as the old "ldr1,ldr2,ldr3,ldr4"
+    lines with protocol='text'. Data goes through a pipe, so fileno() works
+    with select() like a real port.
+    """
+
+    def __init__(self, port=None, baudrate=115200, timeout=None, rate_hz=LDR_RATE_HZ, protocol='binary'):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.rate_hz = rate_hz
+        self.protocol = protocol
+        self.read_fd, self.write_fd = os.pipe()
+        self.buffer = bytearray()
+        self.is_open = True
+        self.lines_sent = 0
+        threading.Thread(target=self._generate, daemon=True).start()
+
+    def _generate(self):
+        period = 1.0 / self.rate_hz
+        deadline = time.monotonic()
+        while self.is_open:
+            error1, error2 = world.tracking_error()
+            values = []
+            for error in (error1, error2):
+                swing = LDR_GAIN * math.sin(math.radians(max(-90.0, min(90.0, error))))
+                for sign in (1, -1):
+                    level = 2000 + sign * swing / 2 + random.gauss(0, LDR_NOISE)
+                    values.append(int(max(0, min(4095, level))))
+            if self.protocol == 'binary':
+                message = ldr_protocol.encode_frame(self.lines_sent, values)
+            else:
+                message = (','.join(map(str, values)) + '\r\n').encode()
+            try:
+                os.write(self.write_fd, message)
+            except OSError:
+                return
+            self.lines_sent += 1
+            deadline += period
+            time.sleep(max(0.0, deadline - time.monotonic()))
+
+    def fileno(self):
+        return self.read_fd
+
+    @property
+    def in_waiting(self):
+        pending = struct.unpack('i', fcntl.ioctl(self.read_fd, termios.FIONREAD, b'\0\0\0\0'))[0]
+        return len(self.buffer) + pending
+
+    def _fill(self, deadline):
+        wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if select.select([self.read_fd], [], [], wait)[0]:
+            self.buffer += os.read(self.read_fd, 4096)
+            return True
+        return False
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while len(self.buffer) < size and self._fill(deadline):
+            pass
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def readline(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while b'\n' not in self.buffer and self._fill(deadline):
+            pass
+        end = self.buffer.find(b'\n') + 1 or len(self.buffer)
+        line = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return line
+
+    def reset_input_buffer(self):
+        self.buffer.clear()
+        while select.select([self.read_fd], [], [], 0)[0]:
+            os.read(self.read_fd, 65536)
+
+    def write(self, data):
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+        os.close(self.write_fd)
+        os.close(self.read_fd)
+
+
+class CompassBus:
+    """
+    smbus2.SMBus stand-in with a QMC5883L compass on it: the heading turns
+    with axis 2, which is what simple_compass_allign.py steps.
+    """
+    FIELD = 3000         # counts of horizontal field
+
+    def __init__(self, bus=1):
+        self.mode = 0
+
+    def write_byte_data(self, address, register, value):
+        self.mode = value
+
+    def read_i2c_block_data(self, address, register, length):
+        tilt, _ = world.update()
+        heading = math.radians(COMPASS_HEADING + tilt[7] + random.gauss(0, 0.2))
+        x = int(self.FIELD * math.cos(heading))
+        y = int(self.FIELD * math.sin(heading))
+        return list(struct.pack('<hhh', x, y, 0))[:length]
+
+    def close(self):
+        pass
+
+
+class Camera:
+    """ cv2.VideoCapture stand-in: a sun disc offset by the tracking error, paced at CAMERA_FPS. """
+    PIXELS_PER_DEGREE = 20
+
+    def __init__(self, index=0, width=640, height=480, fps=CAMERA_FPS):
+        self.width = width
+        self.height = height
+        self.period = 1.0 / fps
+        self.next_frame = time.monotonic()
+        self.frames = 0
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        return 0.0
+
+    def read(self):
+        import numpy as np
+        if not self.opened:
+            return False, None
+        delay = self.next_frame - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_frame = max(self.next_frame + self.period, time.monotonic())
+        error1, error2 = world.tracking_error()
+        cx = self.width / 2 + error2 * self.PIXELS_PER_DEGREE
+        cy = self.height / 2 - error1 * self.PIXELS_PER_DEGREE
+        ys, xs = np.ogrid[:self.height, :self.width]
+        disc = (xs - cx) ** 2 + (ys - cy) ** 2 <= 15 ** 2
+        frame = np.full((self.height, self.width, 3), 20, dtype=np.uint8)
+        frame[disc] = (200, 240, 255)
+        self.frames += 1
+        return True, frame
+
+    def release(self):
+        self.opened = False
+
+
+def pigpio_module():
+    module = types.ModuleType('pigpio')
+    module.pi = Pi
+    module.pulse = pulse
+    for name in ('INPUT', 'OUTPUT', 'WAVE_MODE_ONE_SHOT', 'WAVE_MODE_REPEAT',
+                 'WAVE_MODE_ONE_SHOT_SYNC', 'WAVE_MODE_REPEAT_SYNC', 'NO_TX_WAVE'):
+        setattr(module, name, globals()[name])
+    return module
+
+
+def install():
+    """ Make `import pigpio` and `import RPi.GPIO` resolve to the simulated backends. """
+    rpi = types.ModuleType('RPi')
+    rpi.GPIO = GPIO()
+    sys.modules['RPi'] = rpi
+    sys.modules['RPi.GPIO'] = rpi.GPIO
+    sys.modules['pigpio'] = pigpio_module()
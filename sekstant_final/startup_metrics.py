@@ -0,0 +1,17 @@
+import os
+import sys
+import time
+
+from zygote import LAUNCH_ENV
+
+_launched_at = os.environ.get(LAUNCH_ENV)
+_seen = set()
+
+
+def mark(event):
+    """ Print the time since the program selector launched this tool, once per event. """
+    if _launched_at is None or event in _seen:
+        return
+    _seen.add(event)
+    elapsed = time.monotonic() - float(_launched_at)
+    print(f"[startup] {os.path.basename(sys.argv[0])}: {event} after {elapsed * 1000:.0f} ms", flush=True)
@@ -0,0 +1,535 @@
+import itertools
+import math
+import threading
+import time
+from bisect import bisect_right
+
+import pigpio
+
+# Step pulse timing (microseconds)
+PULSE_US = 10            # STEP high time, well above the driver minimum
+DIR_SETUP_US = 5         # DIR must be stable this long before a STEP edge
+MIN_INTERVAL_US = 100    # 10 kHz per axis keeps a chunk far below pigpio's pulse limit
+CHUNK_US = 20000         # Length of one streamed waveform chunk
+IDLE_POLL = 0.002        # Streamer poll period while chunks are on air
+IDLE_TICK_US = 5000      # Longest a velocity move goes without re-reading its setpoint
+
+
+def constant_intervals(steps, delay):
+    """ Step intervals (us) matching the old HIGH/sleep/LOW/sleep loop; steps=None runs until stopped. """
+    period_us = int(round(2 * delay * 1e6))
+    if steps is None:
+        return itertools.repeat(period_us)
+    return [period_us] * int(steps)
+
+
+class Move:
+    """ Handle for a queued move. `steps` grows as waveform chunks finish transmitting. """
+
+    def __init__(self, dir_pin, step_pin, direction, intervals):
+        self.dir_pin = dir_pin
+        self.step_pin = step_pin
+        self.direction = direction
+        self.axes = [(dir_pin, step_pin, direction)]
+        self.intervals = iter(intervals)
+        self.steps_by_pin = {step_pin: 0}
+        self.exhausted = False
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    @property
+    def steps(self):
+        return self.steps_by_pin[self.step_pin]
+
+    @property
+    def rate(self):
+        """ Achieved steps per second over the move. """
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at or time.monotonic()
+        return self.steps / (end - self.started_at) if end > self.started_at else 0.0
+
+    def next_tick(self):
+        """ Interval after this tick and the step pins that pulse on it, or None when done. """
+        interval = next(self.intervals, None)
+        if interval is None:
+            return None
+        return interval, (self.step_pin,)
+
+    def credit(self, step_pin, direction, done):
+        self.steps_by_pin[step_pin] += done
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class LinearMove(Move):
+    """
+    Several axes on one timeline, Bresenham-interpolated so they arrive together.
+
+    `intervals` paces the axis with the most steps; the others step on a
+    subset of its ticks.
+    """
+
+    def __init__(self, axes, counts, intervals):
+        major = max(range(len(axes)), key=lambda i: counts[i])
+        dir_pin, step_pin, direction = axes[major]
+        super().__init__(dir_pin, step_pin, direction, intervals)
+        self.axes = list(axes)
+        self.counts = [int(c) for c in counts]
+        self.major = self.counts[major]
+        self.errors = [0] * len(axes)
+        self.steps_by_pin = {axis[1]: 0 for axis in axes}
+
+    def next_tick(self):
+        interval = next(self.intervals, None)
+        if interval is None:
+            return None
+        pins = []
+        for i, axis in enumerate(self.axes):
+            self.errors[i] += self.counts[i]
+            if 2 * self.errors[i] >= self.major:
+                self.errors[i] -= self.major
+                pins.append(axis[1])
+        return interval, pins
+
+
+class VelocityMove(Move):
+    """
+    Endless move whose step rate follows a signed setpoint in steps/s.
+
+    The speed ramps towards the setpoint at `max_accel`. Each step interval
+    comes from v^2 = v0^2 + 2*a*(1 step), so the first step from rest goes
+    out after sqrt(2/a) rather than one slow period, and an interval longer
+    than IDLE_TICK_US is split into idle ticks that re-read the setpoint.
+    The fraction of a step covered carries over between ticks, so any rate
+    down to a fraction of a step per second is kept on average. Positive
+    rates drive DIR to `positive`.
+    """
+
+    def __init__(self, dir_pin, step_pin, max_accel, positive=1):
+        super().__init__(dir_pin, step_pin, positive, ())
+        self.max_accel = max_accel
+        self.positive = positive
+        self.target = 0.0
+        self.rate_now = 0.0
+        self.position = 0  # Net steps, positive in the `positive` direction
+        self.phase = 0.0   # Fraction of the way to the next step
+        self.step_due = None  # Direction of the step that goes out on the next tick
+
+    def set_rate(self, steps_per_second):
+        self.target = float(steps_per_second)
+
+    def next_tick(self):
+        if self.exhausted:
+            return None
+        pins = ()
+        if self.step_due is not None:
+            # Directions are snapshotted from `axes` when the tick's pins are collected
+            self.axes = [(self.dir_pin, self.step_pin, self.step_due)]
+            self.step_due = None
+            pins = (self.step_pin,)
+        target = self.target
+        speed = abs(self.rate_now)
+        if speed == 0:
+            if target == 0:
+                return IDLE_TICK_US, pins
+            direction = self.positive if target > 0 else 1 - self.positive
+            if direction != self.direction:
+                self.direction, self.phase = direction, 0.0
+        sign = 1 if self.direction == self.positive else -1
+        # Speed wanted along the current direction; a reversal first ramps down to zero
+        goal = max(target * sign, 0.0)
+        interval, end_speed = self._time_to_step(speed, goal, 1.0 - self.phase)
+        if interval is None or interval > IDLE_TICK_US / 1e6:
+            self._advance(speed, goal, IDLE_TICK_US / 1e6, sign)
+            return IDLE_TICK_US, pins
+        self.rate_now = sign * end_speed
+        self.phase = 0.0
+        self.step_due = self.direction
+        return int(1e6 * interval), pins
+
+    def _time_to_step(self, speed, goal, distance):
+        """ Time and end speed to cover `distance` steps while ramping from speed towards goal; None if it stops first. """
+        a = self.max_accel
+        ramp_t = abs(goal - speed) / a
+        ramp_d = (speed + goal) / 2 * ramp_t
+        if ramp_d >= distance:
+            if goal > speed:
+                end = math.sqrt(speed * speed + 2 * a * distance)
+            elif speed * speed >= 2 * a * distance:
+                end = math.sqrt(speed * speed - 2 * a * distance)
+            else:
+                return None, 0.0
+            return 2 * distance / (speed + end), end
+        if goal == 0:
+            return None, 0.0
+        return ramp_t + (distance - ramp_d) / goal, goal
+
+    def _advance(self, speed, goal, dt, sign):
+        # Move the clock on by dt without reaching the next step
+        ramp_t = abs(goal - speed) / self.max_accel
+        if dt >= ramp_t:
+            end, moved = goal, (speed + goal) / 2 * ramp_t + goal * (dt - ramp_t)
+        else:
+            end = speed + math.copysign(self.max_accel * dt, goal - speed)
+            moved = (speed + end) / 2 * dt
+        self.phase = min(self.phase + moved, 1.0)
+        self.rate_now = sign * end
+
+    def credit(self, step_pin, direction, done):
+        self.steps_by_pin[step_pin] += done
+        self.position += done if direction == self.positive else -done
+
+
+class _Channel:
+    """ One queue of moves on the shared timeline: a single axis or a group of coordinated axes. """
+
+    def __init__(self, pins):
+        self.pins = set(pins)
+        self.moves = []
+        self.current = None
+        self.t = 0             # Next tick time relative to the start of the chunk being built
+
+
+class _Chunk:
+    def __init__(self, wid, duration_us, events):
+        self.wid = wid
+        self.duration_us = duration_us
+        self.events = events   # (move, step_pin, direction) -> step times (us) inside this chunk
+        self.moves = {key[0] for key in events}
+        self.started_at = None
+
+
+class WaveStepper:
+    """
+    DMA-timed step generation through pigpio waveforms.
+
+    Callers only queue moves. A streamer thread merges the steps of every
+    active axis into one timeline and sends it as chained waveform chunks,
+    so pulse timing no longer depends on the GIL. Steps that fall on the
+    same tick go out as one set/clear of the GPIO bank.
+    """
+
+    def __init__(self, pi, journal=None):
+        self.pi = pi
+        self.journal = journal
+        self.channels = {}
+        self.dir_levels = {}
+        self.cond = threading.Condition()
+        self.in_flight = []
+        self.total_steps = 0
+        self.last_rate = 0.0
+        self.clock_at = time.monotonic()  # When channel time 0 comes round: the end of the last chunk sent
+        pi.wave_clear()
+        threading.Thread(target=self._stream, daemon=True).start()
+
+    def queue_move(self, dir_pin, step_pin, direction, intervals):
+        return self._queue((step_pin,), Move(dir_pin, step_pin, direction, intervals))
+
+    def queue_linear_move(self, axes, counts, intervals):
+        """ Coordinated move; axes are (dir_pin, step_pin, direction) and counts their step totals. """
+        return self._queue(tuple(axis[1] for axis in axes), LinearMove(axes, counts, intervals))
+
+    def queue_velocity(self, dir_pin, step_pin, max_accel, positive=1):
+        """ Start an endless velocity-mode move; steer it with set_rate() and end it with stop(). """
+        return self._queue((step_pin,), VelocityMove(dir_pin, step_pin, max_accel, positive))
+
+    def _queue(self, key, move):
+        with self.cond:
+            if key not in self.channels:
+                for dir_pin, step_pin, _ in move.axes:
+                    self.pi.set_mode(dir_pin, pigpio.OUTPUT)
+                    self.pi.set_mode(step_pin, pigpio.OUTPUT)
+                self.channels[key] = _Channel(key)
+            self.channels[key].moves.append(move)
+            self.cond.notify()
+        return move
+
+    def _channels_for(self, step_pin):
+        return [c for c in self.channels.values() if step_pin is None or step_pin in c.pins]
+
+    def is_busy(self, step_pin=None):
+        with self.cond:
+            if any(self._channel_busy(c) for c in self._channels_for(step_pin)):
+                return True
+            return any(step_pin is None or key[1] == step_pin for chunk in self.in_flight for key in chunk.events)
+
+    def stop(self, step_pin=None):
+        """ Abort queued and running moves on one axis, or on all axes when step_pin is None. """
+        with self.cond:
+            stopped = []
+            for channel in self._channels_for(step_pin):
+                if channel.current is not None:
+                    stopped.append(channel.current)
+                stopped.extend(channel.moves)
+                channel.current, channel.moves, channel.t = None, [], 0
+            for move in stopped:
+                move.exhausted = True
+            if not any(self._channel_busy(c) for c in self.channels.values()):
+                # Nothing else shares the timeline, so cut the transmission right away
+                self.pi.wave_tx_stop()
+                self._cut_in_flight(time.monotonic())
+            for move in stopped:
+                self._maybe_finish(move)
+            self.cond.notify()
+
+    def close(self):
+        self.stop()
+        self.pi.wave_clear()
+
+    def _channel_busy(self, channel):
+        return channel.current is not None or bool(channel.moves)
+
+    def _maybe_finish(self, move):
+        if not move.exhausted or move.done.is_set():
+            return
+        if any(move in chunk.moves for chunk in self.in_flight):
+            return
+        move.finished_at = time.monotonic()
+        if move.steps:
+            self.last_rate = move.rate
+        move.done.set()
+
+    def _credit(self, chunk, elapsed_us=None):
+        for (move, pin, direction), times in chunk.events.items():
+            done = len(times) if elapsed_us is None else bisect_right(times, elapsed_us)
+            if done and move.started_at is None:
+                move.started_at = chunk.started_at + times[0] / 1e6
+            move.credit(pin, direction, done)
+            if self.journal is not None and done:
+                self.journal.add(pin, done if direction else -done)
+            self.total_steps += done
+
+    def _settle_in_flight(self):
+        # Credit every chunk the DMA engine has moved past
+        current = self.pi.wave_tx_at() if self.pi.wave_tx_busy() else None
+        while self.in_flight and self.in_flight[0].wid != current:
+            chunk = self.in_flight.pop(0)
+            self._credit(chunk)
+            self.pi.wave_delete(chunk.wid)
+            if self.in_flight:
+                self.in_flight[0].started_at = chunk.started_at + chunk.duration_us / 1e6
+            for move in chunk.moves:
+                self._maybe_finish(move)
+
+    def _cut_in_flight(self, cut_at):
+        # Transmission was stopped: only the steps already on the wire count
+        for i, chunk in enumerate(self.in_flight):
+            if i == 0 and chunk.started_at is not None:
+                self._credit(chunk, (cut_at - chunk.started_at) * 1e6)
+            self.pi.wave_delete(chunk.wid)
+        chunks, self.in_flight = self.in_flight, []
+        for chunk in chunks:
+            for move in chunk.moves:
+                self._maybe_finish(move)
+        for channel in self.channels.values():
+            channel.t = 0
+        self.clock_at = cut_at
+        self.dir_levels.clear()
+
+    def _collect_events(self):
+        events = []
+        exhausted = []
+        for channel in self.channels.values():
+            while channel.t < CHUNK_US:
+                if channel.current is None:
+                    if not channel.moves:
+                        break
+                    channel.current = channel.moves.pop(0)
+                move = channel.current
+                tick = move.next_tick()
+                if tick is None:
+                    move.exhausted = True
+                    channel.current = None
+                    exhausted.append(move)
+                    continue
+                interval, pins = tick
+                if pins:
+                    # Snapshot the directions now; velocity moves change them between ticks
+                    events.append((channel.t, move, [axis for axis in move.axes if axis[1] in pins]))
+                channel.t += max(int(interval), MIN_INTERVAL_US)
+        events.sort(key=lambda e: e[0])
+        return events, exhausted
+
+    def _build_chunk(self):
+        # Merge the step times of every active channel into one pulse list
+        # Once the last chunk has run out, the timeline restarts now: the real time since then passes
+        # unsent for idle velocity moves
+        elapsed_us = int((time.monotonic() - self.clock_at) * 1e6)
+        if elapsed_us > 0:
+            for channel in self.channels.values():
+                channel.t = max(channel.t - elapsed_us, 0)
+            self.clock_at += elapsed_us / 1e6
+        events, exhausted = self._collect_events()
+        if not events:
+            return None, exhausted
+        pulses = []
+        per_pin = {}
+        cursor = 0
+        i = 0
+        while i < len(events):
+            t = max(events[i][0], cursor)
+            step_mask = dir_on = dir_off = 0
+            # Steps falling into the same pulse slot share one bank write
+            while i < len(events) and events[i][0] <= t:
+                _, move, axes = events[i]
+                for dir_pin, step_pin, direction in axes:
+                    step_mask |= 1 << step_pin
+                    if self.dir_levels.get(dir_pin) != direction:
+                        self.dir_levels[dir_pin] = direction
+                        if direction:
+                            dir_on |= 1 << dir_pin
+                        else:
+                            dir_off |= 1 << dir_pin
+                    per_pin.setdefault((move, step_pin, direction), []).append(t)
+                i += 1
+            if dir_on or dir_off:
+                t = max(t, cursor + DIR_SETUP_US)
+                if t - DIR_SETUP_US > cursor:
+                    pulses.append(pigpio.pulse(0, 0, t - DIR_SETUP_US - cursor))
+                pulses.append(pigpio.pulse(dir_on, dir_off, DIR_SETUP_US))
+            elif t > cursor:
+                pulses.append(pigpio.pulse(0, 0, t - cursor))
+            pulses.append(pigpio.pulse(step_mask, 0, PULSE_US))
+            pulses.append(pigpio.pulse(0, step_mask, 0))
+            cursor = t + PULSE_US
+        # Pad to the full chunk so the next chunk continues the same timeline
+        duration = max(CHUNK_US, cursor)
+        if duration > cursor:
+            pulses.append(pigpio.pulse(0, 0, duration - cursor))
+        for channel in self.channels.values():
+            channel.t = max(channel.t - duration, 0)
+
+        self.pi.wave_add_new()
+        self.pi.wave_add_generic(pulses)
+        return _Chunk(self.pi.wave_create(), duration, per_pin), exhausted
+
+    def _stream(self):
+        while True:
+            with self.cond:
+                if self.in_flight:
+                    self._settle_in_flight()
+                # Keep one chunk queued behind the one on air
+                if len(self.in_flight) < 2:
+                    chunk, exhausted = self._build_chunk()
+                    if chunk is not None:
+                        if not self.in_flight:
+                            chunk.started_at = time.monotonic()
+                        self.clock_at += chunk.duration_us / 1e6
+                        self.pi.wave_send_using_mode(chunk.wid, pigpio.WAVE_MODE_ONE_SHOT_SYNC)
+                        self.in_flight.append(chunk)
+                    for move in exhausted:
+                        self._maybe_finish(move)
+                    if chunk is not None:
+                        continue
+                if not self.in_flight:
+                    # Idle velocity moves still need their clock to advance
+                    busy = any(self._channel_busy(c) for c in self.channels.values())
+                    self.cond.wait(CHUNK_US / 1e6 if busy else None)
+                    continue
+            time.sleep(IDLE_POLL)
+
+
+class GPIOStepper:
+    """ Fallback when pigpiod is not running: the original RPi.GPIO sleep() loop behind the same interface. """
+
+    def __init__(self, journal=None):
+        import RPi.GPIO as GPIO
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BCM)
+        self.GPIO = GPIO
+        self.journal = journal
+        self.configured = set()
+        self.locks = {}
+        self.generation = {}
+        self.moves = {}
+        self.last_rate = 0.0
+
+    def queue_move(self, dir_pin, step_pin, direction, intervals):
+        return self._queue(Move(dir_pin, step_pin, direction, intervals))
+
+    def queue_linear_move(self, axes, counts, intervals):
+        return self._queue(LinearMove(axes, counts, intervals))
+
+    def queue_velocity(self, dir_pin, step_pin, max_accel, positive=1):
+        return self._queue(VelocityMove(dir_pin, step_pin, max_accel, positive))
+
+    def _queue(self, move):
+        for dir_pin, step_pin, _ in move.axes:
+            for pin in (dir_pin, step_pin):
+                if pin not in self.configured:
+                    self.GPIO.setup(pin, self.GPIO.OUT)
+                    self.configured.add(pin)
+        pins = sorted(axis[1] for axis in move.axes)
+        locks = [self.locks.setdefault(pin, threading.Lock()) for pin in pins]
+        move.generation = {pin: self.generation.setdefault(pin, 0) for pin in pins}
+        for pin in pins:
+            self.moves.setdefault(pin, []).append(move)
+        threading.Thread(target=self._run, args=(move, locks), daemon=True).start()
+        return move
+
+    def is_busy(self, step_pin=None):
+        pins = list(self.moves) if step_pin is None else [step_pin]
+        return any(not m.done.is_set() for p in pins for m in self.moves.get(p, []))
+
+    def stop(self, step_pin=None):
+        pins = list(self.generation) if step_pin is None else [step_pin]
+        for pin in pins:
+            if pin in self.generation:
+                self.generation[pin] += 1
+        for pin in pins:
+            for move in list(self.moves.get(pin, [])):
+                move.wait()
+
+    def close(self):
+        self.stop()
+
+    def _run(self, move, locks):
+        GPIO = self.GPIO
+        for lock in locks:
+            lock.acquire()
+        try:
+            levels = {}
+            move.started_at = time.monotonic()
+            while all(self.generation[pin] == gen for pin, gen in move.generation.items()):
+                tick = move.next_tick()
+                if tick is None:
+                    break
+                interval, pins = tick
+                if not pins:
+                    time.sleep(interval / 1e6)
+                    continue
+                axes = [axis for axis in move.axes if axis[1] in pins]
+                for dir_pin, _, direction in axes:
+                    if levels.get(dir_pin) != direction:
+                        GPIO.output(dir_pin, direction)
+                        levels[dir_pin] = direction
+                half = interval / 2e6
+                # A list write updates every stepping pin in one call
+                GPIO.output(list(pins), GPIO.HIGH)
+                time.sleep(half)
+                GPIO.output(list(pins), GPIO.LOW)
+                time.sleep(half)
+                for _, pin, direction in axes:
+                    move.credit(pin, direction, 1)
+                    if self.journal is not None:
+                        self.journal.add(pin, 1 if direction else -1)
+            move.exhausted = True
+            move.finished_at = time.monotonic()
+            if move.steps:
+                self.last_rate = move.rate
+            for pin in move.generation:
+                self.moves[pin].remove(move)
+            move.done.set()
+        finally:
+            for lock in locks:
+                lock.release()
+
+
+def make_stepper(pi, journal=None):
+    """ Waveform backend when pigpiod is reachable, sleep loop otherwise. Steps are credited to `journal`. """
+    if pi is not None and pi.connected:
+        return WaveStepper(pi, journal)
+    return GPIOStepper(journal)
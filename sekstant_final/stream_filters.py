@@ -0,0 +1,146 @@
+import math
+from bisect import bisect_left, insort
+
+import numpy as np
+
+# Longest burst handled by one closed-form EMA block; shorter for alpha near 1, so that
+# (1 - alpha)**-n stays below EMA_MAX_GROWTH
+EMA_BLOCK = 128
+EMA_MAX_GROWTH = 1e300
+
+
+class MovingAverage:
+    """ Boxcar average over the last `length` samples, kept as a running sum. """
+
+    def __init__(self, length):
+        self.length = length
+        self.buffer = np.zeros(length)
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def update(self, x):
+        x = float(x)
+        if self.count == self.length:
+            self.total -= self.buffer[self.index]
+        else:
+            self.count += 1
+        self.buffer[self.index] = x
+        self.total += x
+        self.index = (self.index + 1) % self.length
+        return self.total / self.count
+
+    def update_batch(self, xs):
+        """ One output per input, same as calling update() on each. """
+        xs = np.asarray(xs, dtype=float)
+        history = self.history()
+        joined = np.concatenate([history, xs])
+        sums = np.cumsum(np.concatenate([[0.0], joined]))
+        ends = np.arange(len(history) + 1, len(joined) + 1)
+        starts = np.maximum(ends - self.length, 0)
+        out = (sums[ends] - sums[starts]) / (ends - starts)
+        for x in xs[-self.length:]:
+            self.update(x)
+        # Re-sum once per batch so rounding drift from the running sum never builds up
+        self.total = float(self.history().sum())
+        return out
+
+    def history(self):
+        """ Buffered samples, oldest first. """
+        if self.count < self.length:
+            return self.buffer[:self.count].copy()
+        return np.roll(self.buffer, -self.index)
+
+
+class EMA:
+    """ Exponential moving average; works on scalars or on arrays of channels. """
+
+    def __init__(self, alpha, initial=None):
+        self.alpha = alpha
+        self.value = initial
+
+    def update(self, x):
+        if self.value is None:
+            self.value = x
+        else:
+            self.value = self.value * (1 - self.alpha) + x * self.alpha
+        return self.value
+
+    def update_batch(self, xs):
+        """ Filter rows of xs in order; returns one smoothed row per input row. """
+        xs = np.asarray(xs, dtype=float)
+        out = np.empty_like(xs)
+        size = self._block_size()
+        if size < 2:
+            # Too little memory for the closed form to pay off (alpha = 1 has none at all)
+            for i, x in enumerate(xs):
+                out[i] = self.update(x)
+            return out
+        for start in range(0, len(xs), size):
+            block = xs[start:start + size]
+            if self.value is None:
+                self.value = block[0]
+            decay = (1 - self.alpha) ** np.arange(1, len(block) + 1)
+            decay = decay.reshape((-1,) + (1,) * (block.ndim - 1))
+            # y_k = d^k y_0 + a * sum_j d^(k-j) x_j, evaluated with one cumulative sum
+            out[start:start + len(block)] = decay * (self.value + self.alpha * np.cumsum(block / decay, axis=0))
+            self.value = out[start + len(block) - 1].copy()
+        return out
+
+    def _block_size(self):
+        if self.alpha >= 1:
+            return 1
+        return min(EMA_BLOCK, int(math.log(EMA_MAX_GROWTH) / -math.log1p(-self.alpha)))
+
+
+class MovingMedian:
+    """ Median of the last `length` samples, from a sorted window updated by bisection. """
+
+    def __init__(self, length):
+        self.length = length
+        self.window = []
+        self.ring = np.zeros(length)
+        self.index = 0
+
+    def update(self, x):
+        x = float(x)
+        if len(self.window) == self.length:
+            del self.window[bisect_left(self.window, self.ring[self.index])]
+        insort(self.window, x)
+        self.ring[self.index] = x
+        self.index = (self.index + 1) % self.length
+        n = len(self.window)
+        return self.window[n // 2] if n % 2 else (self.window[n // 2 - 1] + self.window[n // 2]) / 2
+
+    def update_batch(self, xs):
+        return np.array([self.update(x) for x in np.asarray(xs, dtype=float)])
+
+
+class FIR:
+    """
+    General FIR filter on a preallocated ring buffer.
+
+    Samples are written twice, `taps` apart, so the last `taps` samples are
+    always one contiguous slice and no per-sample array is allocated.
+    """
+
+    def __init__(self, coefficients):
+        self.coefficients = np.asarray(coefficients, dtype=float)[::-1].copy()
+        self.taps = len(self.coefficients)
+        self.buffer = np.zeros(2 * self.taps)
+        self.index = 0
+
+    def update(self, x):
+        self.buffer[self.index] = self.buffer[self.index + self.taps] = x
+        self.index = (self.index + 1) % self.taps
+        return float(self.coefficients @ self.buffer[self.index:self.index + self.taps])
+
+    def update_batch(self, xs):
+        xs = np.asarray(xs, dtype=float)
+        history = self.buffer[self.index:self.index + self.taps]
+        joined = np.concatenate([history[1:], xs])
+        out = np.convolve(joined, self.coefficients[::-1], 'valid')
+        for x in xs[-self.taps:]:
+            self.buffer[self.index] = self.buffer[self.index + self.taps] = x
+            self.index = (self.index + 1) % self.taps
+        return out
@@ -0,0 +1,130 @@
+import os
+import threading
+
+import numpy as np
+
+RECENT_SAMPLES = 1 << 16   # Full-resolution samples kept in RAM
+LEVEL_SAMPLES = 1 << 15    # Samples per downsampled level
+FACTOR = 10                # Each level averages this many samples of the one below
+LEVELS = 4
+
+SPILL_DTYPE = np.dtype([('t', '<f8'), ('v', '<f4')])
+
+
+class _Buffer:
+    """ Contiguous time/value arrays that grow by doubling. """
+
+    def __init__(self, value_dtype, capacity=1024):
+        self.t = np.empty(capacity)
+        self.v = np.empty(capacity, dtype=value_dtype)
+        self.n = 0
+
+    def extend(self, t, v):
+        need = self.n + len(t)
+        if need > len(self.t):
+            size = max(need, 2 * len(self.t))
+            self.t = np.concatenate([self.t[:self.n], np.empty(size - self.n)])
+            self.v = np.concatenate([self.v[:self.n], np.empty(size - self.n, dtype=self.v.dtype)])
+        self.t[self.n:need] = t
+        self.v[self.n:need] = v
+        self.n = need
+
+    def take_front(self, k):
+        """ Remove and return the oldest k samples. """
+        t, v = self.t[:k].copy(), self.v[:k].copy()
+        self.t[:self.n - k] = self.t[k:self.n]
+        self.v[:self.n - k] = self.v[k:self.n]
+        self.n -= k
+        return t, v
+
+    def arrays(self):
+        return self.t[:self.n], self.v[:self.n]
+
+
+class TimeSeries:
+    """
+    Bounded store for a long (time, value) stream.
+
+    The newest RECENT_SAMPLES stay at full resolution. Older samples are
+    averaged FACTOR:1 into level 0, level 0 into level 1 and so on. The
+    coarsest level drops its oldest samples, so memory stays bounded. With
+    a spill_path, every sample that leaves the recent window is also
+    appended to that file, and range() reads it back through a memory map.
+    """
+
+    def __init__(self, spill_path=None, recent=RECENT_SAMPLES, level_size=LEVEL_SAMPLES,
+                 factor=FACTOR, levels=LEVELS, value_dtype=np.float32):
+        self.recent = _Buffer(value_dtype)
+        self.levels = [_Buffer(value_dtype) for _ in range(levels)]
+        self.recent_size = recent
+        self.level_size = level_size
+        self.factor = factor
+        self.count = 0
+        self.lock = threading.Lock()
+        self.spill_path = spill_path
+        self.spill = None
+        if spill_path is not None:
+            os.makedirs(os.path.dirname(spill_path) or '.', exist_ok=True)
+            self.spill = open(spill_path, 'wb')
+        self.spilled = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, t, v):
+        self.extend([t], [v])
+
+    def extend(self, t, v):
+        with self.lock:
+            self.recent.extend(t, v)
+            self.count += len(t)
+            if self.recent.n > self.recent_size:
+                self._age_out()
+
+    def _age_out(self):
+        # Move the older half of the recent window down, whole FACTOR groups at a time
+        k = (self.recent.n - self.recent_size // 2) // self.factor * self.factor
+        t, v = self.recent.take_front(k)
+        if self.spill is not None:
+            record = np.empty(k, dtype=SPILL_DTYPE)
+            record['t'], record['v'] = t, v
+            self.spill.write(record.tobytes())
+            self.spill.flush()
+            self.spilled += k
+        for i, level in enumerate(self.levels):
+            groups = len(t) // self.factor
+            if not groups:
+                break
+            level.extend(t[:groups * self.factor].reshape(groups, -1).mean(axis=1),
+                         v[:groups * self.factor].reshape(groups, -1).mean(axis=1))
+            if level.n <= self.level_size:
+                break
+            k = (level.n - self.level_size // 2) // self.factor * self.factor
+            t, v = level.take_front(k)
+            if i == len(self.levels) - 1:
+                break  # Coarsest level: the oldest samples are dropped
+
+    def arrays(self):
+        """ Whole session, oldest first: coarse levels for old data, then the recent full-resolution window. """
+        with self.lock:
+            parts = [buffer.arrays() for buffer in reversed(self.levels)] + [self.recent.arrays()]
+            return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def range(self, start, end):
+        """ Full-resolution samples with start <= t <= end, from the spill file and the recent window. """
+        with self.lock:
+            ts, vs = [], []
+            if self.spilled:
+                spill = np.memmap(self.spill_path, dtype=SPILL_DTYPE, mode='r', shape=(self.spilled,))
+                lo, hi = np.searchsorted(spill['t'], start, side='left'), np.searchsorted(spill['t'], end, side='right')
+                ts.append(np.array(spill['t'][lo:hi]))
+                vs.append(np.array(spill['v'][lo:hi]))
+            t, v = self.recent.arrays()
+            lo, hi = np.searchsorted(t, start, side='left'), np.searchsorted(t, end, side='right')
+            ts.append(t[lo:hi].copy())
+            vs.append(v[lo:hi].copy())
+            return np.concatenate(ts), np.concatenate(vs)
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
@@ -0,0 +1,263 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pid import PID
+from stream_filters import EMA
+
+# Plant constants shared with the live simulator
+import sim_hardware
+from sim_hardware import LDR_GAIN, LDR_NOISE, LDR_RATE_HZ, MECH_TAU, STEPS_PER_DEGREE
+
+# Velocity mode runs the real VelocityMove; nothing here drives pins, so the simulated pigpio will do
+sim_hardware.install()
+from stepper_wave import VelocityMove, MIN_INTERVAL_US
+
+SUN_DEG_PER_S = 15 / 3600   # Real sky rate; the live simulator speeds this up, the offline one does not
+LOCK_DEG = 0.5              # Locked once the pointing error stays inside this for the rest of the run
+
+# Control settings as they are in the tools: tracker_angle.py queues step corrections,
+# longetude.py sets step rates, feed_forward times the sun's rate plus the PID trim
+DEFAULTS = {
+    'steps': {'kp': 0.2, 'ki': 0.02, 'kd': 0.0, 'alpha': 0.1, 'max_step': 50, 'delay': 0.005,
+              'control_hz': 20, 'max_accel': None},
+    'velocity': {'kp': 1.0, 'ki': 0.0, 'kd': 0.0, 'alpha': 0.1, 'max_step': 100, 'delay': None,
+                 'control_hz': 20, 'max_accel': 400, 'feed_forward': 0.0},
+}
+PLANT = {'mode': 'steps', 'duration': 120.0, 'latency': 0.02, 'ldr_rate': LDR_RATE_HZ,
+         'offset': (5.0, -3.0), 'sun_rate': SUN_DEG_PER_S, 'seed': 0}
+
+
+class StepAxis:
+    """ Axis driven by AxisWorker: fixed-period moves, a newer correction replaces the pending one. """
+
+    def __init__(self, delay):
+        self.period = 2 * delay
+        self.position = 0.0
+        self.steps = 0
+        self.move = None      # (start time, direction, steps)
+        self.taken = 0        # Steps of the current move already applied
+        self.pending = None
+        self.time = 0.0
+
+    def command(self, output, now):
+        direction = 1 if output >= 0 else -1
+        self.pending = (direction, abs(int(output)))
+        if self.move is None:
+            self._start(now)
+
+    def _start(self, now):
+        if self.pending is not None and self.pending[1]:
+            self.move = (now,) + self.pending
+        self.pending = None
+
+    def advance(self, now):
+        while self.move is not None:
+            start, direction, steps = self.move
+            end = start + steps * self.period
+            done = min(steps, int((min(now, end) - start) / self.period))
+            taken = done - self.taken
+            self.position += direction * taken
+            self.steps += taken
+            self.taken = done
+            if now < end:
+                break
+            self.move, self.taken = None, 0
+            self._start(end)
+        self.time = now
+
+
+class VelocityAxis:
+    """
+    Axis in velocity mode: stepper_wave's own VelocityMove, ticked on the
+    simulated clock, so whole steps and the ramp are those of the real
+    stepper.
+    """
+
+    def __init__(self, max_accel):
+        self.move = VelocityMove(None, None, max_accel)
+        self.position = 0
+        self.steps = 0
+        self.tick = 0.0       # Time of the move's next tick
+        self.time = 0.0
+
+    def command(self, output, now):
+        self.move.set_rate(output)
+
+    def advance(self, now):
+        while self.tick <= now:
+            interval, pins = self.move.next_tick()
+            if pins:
+                self.position += 1 if self.move.axes[0][2] == self.move.positive else -1
+                self.steps += 1
+            self.tick += max(interval, MIN_INTERVAL_US) / 1e6
+        self.time = now
+
+
+def settings(params):
+    """ Plant and control settings for a run: PLANT, then the mode's DEFAULTS, then `params`. """
+    p = dict(PLANT)
+    p.update(DEFAULTS[params.get('mode', PLANT['mode'])])
+    p.update(params)
+    return p
+
+
+class Plant:
+    """
+    Sun, LDRs, serial link and both axes, advanced in simulated time.
+
+    The LDRs are sampled at ldr_rate with the live simulator's response and
+    noise, and each sample is delivered `latency` seconds later. Axis
+    output goes to a step or velocity model with a first-order mechanical
+    lag. Deterministic for a given seed.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.rng = random.Random(p['seed'])
+        if p['mode'] == 'steps':
+            self.axes = [StepAxis(p['delay']) for _ in range(2)]
+        else:
+            self.axes = [VelocityAxis(p['max_accel']) for _ in range(2)]
+        self.tilt = [0.0, 0.0]
+        self.n = int(p['duration'] * p['ldr_rate'])
+        self.measured = [i / p['ldr_rate'] for i in range(self.n)]
+        self.readings = [None] * self.n
+        self.errors = [0.0] * self.n
+        self.last_time = 0.0
+        self.i = self.j = 0
+
+    def remaining(self):
+        return self.j < self.n
+
+    def _advance(self, now):
+        lag = 1 - math.exp(-(now - self.last_time) / MECH_TAU)
+        for k, axis in enumerate(self.axes):
+            axis.advance(now)
+            self.tilt[k] += (axis.position / STEPS_PER_DEGREE - self.tilt[k]) * lag
+        self.last_time = now
+
+    def _measure(self, now):
+        p = self.p
+        sun = (p['offset'][0] + p['sun_rate'] * now, p['offset'][1])
+        error = [sun[k] - self.tilt[k] for k in range(2)]
+        self.errors[self.i] = math.hypot(*error)
+        pair = []
+        for k in range(2):
+            swing = LDR_GAIN * math.sin(math.radians(max(-90.0, min(90.0, error[k]))))
+            levels = [int(max(0, min(4095, 2000 + sign * swing / 2 + self.rng.gauss(0, LDR_NOISE))))
+                      for sign in (1, -1)]
+            pair.append(levels[0] - levels[1])
+        self.readings[self.i] = pair
+
+    def next_delivery(self):
+        """ Advance to the next sample arriving over serial: (arrival time, LDR differences, sample time). """
+        while True:
+            deliver = self.measured[self.j] + self.p['latency']
+            if self.i < self.n and self.measured[self.i] <= deliver:
+                self._advance(self.measured[self.i])
+                self._measure(self.measured[self.i])
+                self.i += 1
+                continue
+            self._advance(deliver)
+            self.j += 1
+            return deliver, self.readings[self.j - 1], self.measured[self.j - 1]
+
+    def command(self, k, output, now):
+        self.axes[k].command(output, now)
+
+    def metrics(self):
+        measured, errors = self.measured[:self.i], self.errors[:self.i]
+        outside = [t for t, e in zip(measured, errors) if e > LOCK_DEG]
+        lock = outside[-1] if outside else 0.0
+        locked = lock < measured[-1]
+        after = [e for t, e in zip(measured, errors) if t > lock] if locked else errors
+        return {'time_to_lock': lock if locked else None,
+                'rms_error': math.sqrt(sum(e * e for e in after) / len(after)),
+                'steps': int(sum(axis.steps for axis in self.axes))}
+
+
+def simulate(params):
+    """
+    Run the tracking loop against the Plant, faster than real time.
+
+    The same EMA and PID classes the tools use act on each delivered
+    sample, on top of the feed-forward rate in velocity mode. Returns the
+    parameters with time_to_lock, rms_error, steps and the mean
+    measurement-to-actuation delay added.
+    """
+    p = settings(params)
+    plant = Plant(p)
+    dt = 1 / p['control_hz']
+    pids = [PID(p['kp'], p['ki'], p['kd'], dt=dt, limit=p['max_step']) for _ in range(2)]
+    # The tools smooth each LDR and subtract; the EMA is linear, so smoothing the difference is the same
+    smoothing = [EMA(p['alpha'], initial=0.0) for _ in range(2)]
+    # Velocity mode: the ephemeris rate, scaled to model gearing or site errors; the sun only moves on axis 1
+    feed_forward = [p.get('feed_forward', 0.0) * p['sun_rate'] * STEPS_PER_DEGREE, 0.0]
+    latencies = []
+    while plant.remaining():
+        now, reading, measured = plant.next_delivery()
+        smoothed = [smoothing[k].update(reading[k]) for k in range(2)]
+        if pids[0].due(now):
+            for k in range(2):
+                plant.command(k, feed_forward[k] + pids[k].update(smoothed[k], now), now)
+            latencies.append(now - measured)
+    result = dict(params)
+    result.update(plant.metrics())
+    result['actuation_latency'] = sum(latencies) / len(latencies) if latencies else None
+    return result
+
+
+def sweep(grid, base=None, workers=None):
+    """ Simulate every combination of the lists in `grid` on a process pool, in grid order. """
+    names = list(grid)
+    runs = [dict(base or {}, **dict(zip(names, values))) for values in itertools.product(*grid.values())]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(simulate, runs, chunksize=max(1, len(runs) // (4 * (workers or os.cpu_count() or 1)))))
+
+
+def rank(results):
+    """ Locked runs first, fastest lock, then lowest RMS error, then fewest steps. """
+    return sorted(results, key=lambda r: (r['time_to_lock'] is None, r['time_to_lock'] or 0.0,
+                                          round(r['rms_error'], 3), r['steps']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep tracker control parameters on a simulated sun, LDR and stepper plant.')
+    parser.add_argument('--mode', choices=sorted(DEFAULTS), default=PLANT['mode'],
+                        help='steps: queued corrections (tracker_angle); velocity: step rates (longetude)')
+    for name in ('kp', 'ki', 'kd', 'alpha', 'max_step', 'delay', 'control_hz', 'max_accel', 'feed_forward', 'latency'):
+        parser.add_argument('--' + name.replace('_', '-'), type=float, nargs='+', help='values to sweep')
+    parser.add_argument('--duration', type=float, default=PLANT['duration'])
+    parser.add_argument('--seed', type=int, default=PLANT['seed'])
+    parser.add_argument('--workers', type=int, help='processes in the pool (default: one per CPU)')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--output', help='write every result to this JSON file')
+    args = parser.parse_args()
+
+    swept = set(DEFAULTS[args.mode]) | {'latency'}
+    grid = {name: values for name, values in vars(args).items() if name in swept and values is not None}
+    base = {'mode': args.mode, 'duration': args.duration, 'seed': args.seed}
+    start = time.perf_counter()
+    results = rank(sweep(grid or {'kp': [DEFAULTS[args.mode]['kp']]}, base, args.workers))
+    elapsed = time.perf_counter() - start
+    print(f"{len(results)} runs of {args.duration:.0f} s in {elapsed:.1f} s")
+    for r in results[:args.top]:
+        swept = ', '.join(f"{name}={r[name]:g}" for name in grid)
+        lock = f"{r['time_to_lock']:.1f} s" if r['time_to_lock'] is not None else 'never'
+        print(f"lock {lock:>8}  rms {r['rms_error']:.3f} deg  steps {r['steps']:6d}  {swept}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import numpy as np
+
+FIT_WINDOW_S = 3600.0   # Samples this far either side of the highest one enter the fit
+MIN_SAMPLES = 20
+Z_95 = 1.96
+
+
+class Transit:
+    """ Fitted time of the angle maximum, with its standard error and 95% interval (seconds). """
+
+    def __init__(self, t_peak, peak_angle, stderr, n, rms):
+        self.t_peak = t_peak
+        self.peak_angle = peak_angle
+        self.stderr = stderr
+        self.ci = Z_95 * stderr
+        self.n = n
+        self.rms = rms
+
+
+def estimate_transit(t, angle, window=FIT_WINDOW_S):
+    """
+    Least-squares parabola through the samples around the highest one.
+
+    t are monotonic seconds, angle the matching readings. Returns a
+    Transit, or None when the data does not bracket a maximum yet.
+    """
+    t = np.asarray(t, dtype=float)
+    angle = np.asarray(angle, dtype=float)
+    if len(t) < MIN_SAMPLES:
+        return None
+    t_max = t[np.argmax(angle)]
+    keep = np.abs(t - t_max) <= window
+    t, angle = t[keep], angle[keep]
+    if len(t) < MIN_SAMPLES:
+        return None
+
+    # Centre and scale time so the normal equations stay well conditioned
+    t0, scale = t.mean(), max(np.ptp(t), 1e-9)
+    x = (t - t0) / scale
+    design = np.column_stack([x * x, x, np.ones_like(x)])
+    coeffs, _, rank, _ = np.linalg.lstsq(design, angle, rcond=None)
+    a, b, c = coeffs
+    if rank < 3 or a >= 0:
+        return None
+    x_peak = -b / (2 * a)
+    if not x.min() <= x_peak <= x.max():
+        return None  # Still rising or already falling across the whole window
+
+    residuals = angle - design @ coeffs
+    dof = max(len(x) - 3, 1)
+    sigma2 = residuals @ residuals / dof
+    cov = sigma2 * np.linalg.inv(design.T @ design)
+    # Delta method for x_peak = -b / 2a
+    grad = np.array([b / (2 * a * a), -1 / (2 * a), 0.0])
+    stderr = float(np.sqrt(grad @ cov @ grad)) * scale
+    return Transit(t0 + x_peak * scale, float(c - b * b / (4 * a)), stderr, len(x), float(np.sqrt(sigma2)))
@@ -0,0 +1,66 @@
+import json
+import os
+
+DEFAULT_PATH = os.path.expanduser('~/.sekstant/profile.json')
+SIM_PATH = os.path.expanduser('~/.sekstant/sim-profile.json')
+
+GAIN_KEYS = ('kp', 'ki', 'kd', 'limit')
+MOTION_KEYS = ('max_rate', 'max_accel', 'deg_per_step')
+
+
+class UnitProfile:
+    """
+    Per-unit settings measured by the autotuners, kept as JSON.
+
+    Sections are plain dicts; `gains[mode][axis]` holds the tracking loop
+    gains for 'steps' (queued corrections) and 'velocity' (step rates),
+    `motion[axis]` the step rate and acceleration limits and the IMU
+    degrees per step, `site` the latitude and longitude. A missing or
+    unreadable file reads as empty, so tools fall back to their built-in
+    defaults.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def section(self, name):
+        return self.data.get(name, {})
+
+    def update(self, name, values):
+        self.data.setdefault(name, {}).update(values)
+
+    def gains(self, mode, axis, **defaults):
+        """ PID keyword arguments for one axis: the defaults, overridden by any tuned values. """
+        tuned = self.section('gains').get(mode, {}).get(str(axis), {})
+        defaults.update({key: tuned[key] for key in GAIN_KEYS if key in tuned})
+        return defaults
+
+    def set_gains(self, mode, axis, values):
+        self.data.setdefault('gains', {}).setdefault(mode, {})[str(axis)] = values
+
+    def motion(self, axis, **defaults):
+        """ max_rate (steps/s), max_accel (steps/s^2) and deg_per_step for one axis: measured values, else the defaults. """
+        measured = self.section('motion').get(str(axis), {})
+        defaults.update({key: measured[key] for key in MOTION_KEYS if key in measured})
+        return defaults
+
+    def set_motion(self, axis, values):
+        self.data.setdefault('motion', {})[str(axis)] = values
+
+    def step_delay(self, axis, delay):
+        """ Half step period for constant-rate moves: `delay`, lengthened if the axis cannot step that fast. """
+        max_rate = self.motion(axis).get('max_rate')
+        return delay if max_rate is None else max(delay, 1 / (2 * max_rate))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Write and rename, so a crash never leaves a half-written profile behind
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
@@ -0,0 +1,84 @@
+import json
+import os
+import runpy
+import signal
+import socket
+import sys
+import time
+
+# Heavy modules that are safe to import before any hardware is touched
+PRELOAD = ['numpy', 'cv2', 'PyQt5.QtCore', 'PyQt5.QtGui', 'PyQt5.QtWidgets',
+           'matplotlib', 'serial', 'pigpio', 'BMI160_i2c', 'smbus2']
+
+LAUNCH_ENV = 'SEKSTANT_LAUNCH_T'
+
+
+class Zygote:
+    """
+    Process that imports the heavy modules once and forks a child per tool launch.
+
+    Must be created before the caller builds its QApplication, since the
+    fork copies the whole interpreter.
+    """
+
+    def __init__(self, preload=PRELOAD):
+        self.sock, child_sock = socket.socketpair()
+        self.pid = os.fork()
+        if self.pid == 0:
+            self.sock.close()
+            _serve(child_sock, preload)
+        child_sock.close()
+        self.replies = self.sock.makefile('r')
+
+    def launch(self, script_path, args=()):
+        """ Start script_path as __main__ in a forked child, with `args` as its command line; returns its pid. """
+        request = json.dumps([repr(time.monotonic()), os.path.abspath(script_path), list(args)]) + "\n"
+        self.sock.sendall(request.encode())
+        return int(self.replies.readline())
+
+    def close(self):
+        self.sock.close()
+
+
+def _serve(sock, preload):
+    start = time.monotonic()
+    for name in preload:
+        try:
+            __import__(name)
+        except ImportError as e:
+            print(f"Zygote could not preload {name}: {e}")
+    print(f"Zygote preloaded {len(preload)} modules in {time.monotonic() - start:.2f} s", flush=True)
+
+    # Children are never waited on, let the kernel reap them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    requests = sock.makefile('r')
+    for line in requests:
+        launched_at, script_path, args = json.loads(line)
+        pid = os.fork()
+        if pid == 0:
+            requests.close()
+            sock.close()
+            _run_child(script_path, args, launched_at)
+        sock.sendall(f"{pid}\n".encode())
+    os._exit(0)
+
+
+def _run_child(script_path, args, launched_at):
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    os.setsid()
+    os.environ[LAUNCH_ENV] = launched_at
+    sys.argv = [script_path] + args
+    sys.path.insert(0, os.path.dirname(script_path))
+    code = 0
+    try:
+        runpy.run_path(script_path, run_name='__main__')
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 0
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    os._exit(code)
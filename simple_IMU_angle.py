@@ -1,21 +1,39 @@
-from time import sleep
-from BMI160_i2c import Driver
+from time import sleep, monotonic
 import math
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sekstant_final'))
+import hardware
+import sensor_fusion
+
+GYRO_LSB = 131.2  # Driver() default range, +-250 deg/s
+SAMPLE_PERIOD = 0.01
+PRINT_EVERY = 50  # samples, so the angle is still printed every 0.5 s
 
 print('Trying to initialize the sensor...')
-sensor = Driver(0x69)  # change address if needed
+sensor = hardware.imu()  # BMI160 at hardware.IMU_ADDRESS, or the simulated one with --sim
 print('Initialization done')
 
+# Gyro+accelerometer fusion (--kalman for the Kalman filter)
+imu_filter = sensor_fusion.make_filter()
+last = monotonic()
+count = 0
+
 while True:
     data = sensor.getMotion6()
+    gx = data[0] / GYRO_LSB
     ax, ay, az = data[3], data[4], data[5]
+    now = monotonic()
 
     # Calculate roll angle in degrees and invert it to get the "IMU angle"
     roll = math.atan2(ay, az)
     roll_deg = math.degrees(roll)
-    imu_angle = -roll_deg  # Invert roll to become the IMU angle
+    imu_angle = imu_filter.update(-roll_deg, -gx, now - last)  # Invert roll to become the IMU angle
+    last = now
 
     # Output the IMU angle
-    print(f'IMU angle: {imu_angle:.2f} degrees')
+    count += 1
+    if count % PRINT_EVERY == 0:
+        print(f'IMU angle: {imu_angle:.2f} degrees')
 
-    sleep(0.5)
+    sleep(SAMPLE_PERIOD)
@@ -1,16 +1,19 @@
-import RPi.GPIO as GPIO
-import smbus2
 import time
 import math
-import numpy as np
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sekstant_final'))
+import hardware
+from stream_filters import FIR
+from stepper_wave import constant_intervals
 
 # Compass setup
 DEVICE_ADDRESS = 0x0D
 REGISTER_MODE = 0x09
 REGISTER_X_LSB = 0x00
 
-# Initialize I2C (SMBus)
-bus = smbus2.SMBus(1)
+# Initialize I2C (SMBus); --sim for the simulated compass
+bus = hardware.compass_bus()
 
 # Set continuous measurement mode
 bus.write_byte_data(DEVICE_ADDRESS, REGISTER_MODE, 0x01)
@@ -18,10 +21,9 @@ bus.write_byte_data(DEVICE_ADDRESS, REGISTER_MODE, 0x01)
 # FIR Filter setup
 num_taps = 10  # Number of filter taps
 coefficients = [1.0 / num_taps] * num_taps  # Coefficients for a simple moving average
-heading_buffer = np.zeros(num_taps)  # Buffer to store the last 'num_taps' heading values
+heading_filter = FIR(coefficients)  # Ring buffer of the last 'num_taps' heading values
 
 def read_heading_filtered():
-    global heading_buffer
     data = bus.read_i2c_block_data(DEVICE_ADDRESS, REGISTER_X_LSB, 6)
     x = (data[1] << 8) | data[0]
     y = (data[3] << 8) | data[2]
@@ -30,32 +32,19 @@ def read_heading_filtered():
         heading += 2 * math.pi
     heading_degrees = math.degrees(heading)
 
-    # Update buffer
-    heading_buffer = np.roll(heading_buffer, -1)
-    heading_buffer[-1] = heading_degrees
-
     # Apply FIR filter (convolution)
-    filtered_heading = np.dot(coefficients, heading_buffer)
-    return filtered_heading
+    return heading_filter.update(heading_degrees)
 
 # GPIO setup for stepper motors
 DIR1, STEP1 = 8, 7
 CW, CCW = 1, 0
-GPIO.setwarnings(False)
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(DIR1, GPIO.OUT)
-GPIO.setup(STEP1, GPIO.OUT)
+stepper = hardware.stepper()
 
 delay = 0.005  # Time between steps
 
 # Function to rotate stepper motor
 def rotate_motor(steps, direction):
-    GPIO.output(DIR1, direction)
-    for _ in range(steps):
-        GPIO.output(STEP1, GPIO.HIGH)
-        time.sleep(delay)
-        GPIO.output(STEP1, GPIO.LOW)
-        time.sleep(delay)
+    stepper.queue_move(DIR1, STEP1, direction, constant_intervals(steps, delay)).wait()
 
 try:
     # Rotate motor until it faces approximately North using filtered compass readings
@@ -73,5 +62,4 @@ try:
 except KeyboardInterrupt:
     print("Program stopped")
 finally:
-    GPIO.cleanup()  # Clean up GPIO to ensure it resets
-    bus.close()
+    hardware.shutdown()  # Stops the motor, closes the bus and resets the GPIO
@@ -2,10 +2,10 @@ import sys
 import threading
 from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout
 from PyQt5.QtCore import Qt
-import RPi.GPIO as GPIO
-from time import sleep
-
-GPIO.setwarnings(False)
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sekstant_final'))
+import hardware
+from stepper_wave import constant_intervals
 
 # GPIO setup for Motor 1
 DIR1 = 20    # Direction GPIO Pin for Motor 1
@@ -17,21 +17,16 @@ STEP2 = 7    # Step GPIO Pin for Motor 2
 CW = 1       # Clockwise Rotation
 CCW = 0      # Counterclockwise Rotation
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(DIR1, GPIO.OUT)
-GPIO.setup(STEP1, GPIO.OUT)
-GPIO.setup(DIR2, GPIO.OUT)
-GPIO.setup(STEP2, GPIO.OUT)
-
 delay = 0.0025
 
+# Step pulses are generated by pigpio waveforms (falls back to GPIO bit-banging; --sim for the simulator)
+stepper = hardware.stepper()
+
 def step_motor(dir_pin, step_pin, direction):
-    while threading.currentThread().running:
-        GPIO.output(dir_pin, direction)
-        GPIO.output(step_pin, GPIO.HIGH)
-        sleep(delay)
-        GPIO.output(step_pin, GPIO.LOW)
-        sleep(delay)
+    move = stepper.queue_move(dir_pin, step_pin, direction, constant_intervals(None, delay))
+    while not move.wait(0.05):
+        if not threading.currentThread().running:
+            stepper.stop(step_pin)
 
 class StepperControlApp(QApplication):
     def __init__(self, args):
@@ -84,5 +79,7 @@ class StepperControlWindow(QWidget):
 
 if __name__ == "__main__":
     app = StepperControlApp(sys.argv)
-    sys.exit(app.exec_())
+    code = app.exec_()
+    hardware.shutdown()
+    sys.exit(code)
 W
\ No newline at end of file
@@ -1,13 +1,18 @@
 import sys
-import threading
-from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout
-from PyQt5.QtCore import Qt
-import RPi.GPIO as GPIO
-from time import sleep
-import serial
-
-# Setup for serial communication with ESP32
-ser = serial.Serial('/dev/serial0', 115200)
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sekstant_final'))
+import hardware
+from motion_worker import AxisWorker
+import numpy as np
+from stream_filters import EMA
+from serial_reader import SerialReader
+from ldr_protocol import LDRDecoder
+from pid import PID
+
+# Setup for serial communication with ESP32 (simulated with --sim)
+ser = hardware.serial_port()
+if ser is None:
+    sys.exit(1)
 
 # GPIO setup for Motor 1 and Motor 2
 DIR1 = 20  # Direction GPIO Pin for Motor 1
@@ -17,26 +22,28 @@ STEP2 = 7   # Step GPIO Pin for Motor 2
 CW = 1     # Clockwise Rotation
 CCW = 0    # Counterclockwise Rotation
 
-GPIO.setwarnings(False)
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(DIR1, GPIO.OUT)
-GPIO.setup(STEP1, GPIO.OUT)
-GPIO.setup(DIR2, GPIO.OUT)
-GPIO.setup(STEP2, GPIO.OUT)
-
 delay = 0.005  # Increased delay to smooth out motor movement
 
-# Proportional and Integral gains for the PI controller
-Kp = 0.05  # Reduced proportional gain
-Ki = 0.005  # Reduced integral gain
+# Step pulses are generated by pigpio waveforms (falls back to GPIO bit-banging)
+stepper = hardware.stepper()
+
+# Measured per-unit limits and gains (rate_calibration.py, autotune.py)
+unit_profile = hardware.unit_profile()
 
-# Integral sums
-integral1 = 0
-integral2 = 0
+# One persistent worker per axis; newer corrections replace ones not yet started
+axis1 = AxisWorker(stepper, DIR1, STEP1, unit_profile.step_delay(1, delay))
+axis2 = AxisWorker(stepper, DIR2, STEP2, unit_profile.step_delay(2, delay))
 
-# Previous errors
-prev_error1 = 0
-prev_error2 = 0
+# PID gains (per second) and control rate; output is steps per control period
+CONTROL_HZ = 20
+Kp = 0.2   # Locks in about 12 s in tracker_sim; 0.05 with Ki 0.1 never locks
+Ki = 0.02
+Kd = 0.0
+MAX_STEP = 50  # Maximum number of steps per iteration
+
+# One controller per axis, with anti-windup and a filtered derivative; gains from autotune.py win
+pid1 = PID(dt=1 / CONTROL_HZ, **unit_profile.gains('steps', 1, kp=Kp, ki=Ki, kd=Kd, limit=MAX_STEP))
+pid2 = PID(dt=1 / CONTROL_HZ, **unit_profile.gains('steps', 2, kp=Kp, ki=Ki, kd=Kd, limit=MAX_STEP))
 
 # Smoothed LDR values
 smooth_ldr1 = 0
@@ -44,51 +51,37 @@ smooth_ldr2 = 0
 smooth_ldr3 = 0
 smooth_ldr4 = 0
 alpha = 0.1  # Smoothing factor
-
-def pi_control(target, prev_error, integral):
-    error = target
-    integral += error
-    derivative = error - prev_error
-    output = Kp * error + Ki * integral
-    max_step = 50  # Maximum number of steps per iteration
-    output = max(-max_step, min(max_step, output))  # Limiting the output steps
-    return output, error, integral
-
-def motor_control(motor_dir_pin, motor_step_pin, direction, steps):
-    GPIO.output(motor_dir_pin, direction)
-    for _ in range(abs(steps)):
-        GPIO.output(motor_step_pin, GPIO.HIGH)
-        sleep(delay)
-        GPIO.output(motor_step_pin, GPIO.LOW)
-        sleep(delay)
-
-while True:
-    if ser.in_waiting > 0:
-        line = ser.readline().decode('utf-8').strip()
-        ldr_values = line.split(',')
-        if len(ldr_values) == 4:
-            try:
-                # Apply smoothing to sensor values
-                smooth_ldr1 = smooth_ldr1 * (1 - alpha) + int(ldr_values[0]) * alpha
-                smooth_ldr2 = smooth_ldr2 * (1 - alpha) + int(ldr_values[1]) * alpha
-                smooth_ldr3 = smooth_ldr3 * (1 - alpha) + int(ldr_values[2]) * alpha
-                smooth_ldr4 = smooth_ldr4 * (1 - alpha) + int(ldr_values[3]) * alpha
-
-                # Calculate differences
-                difference1 = smooth_ldr1 - smooth_ldr2
-                difference2 = smooth_ldr3 - smooth_ldr4
-
-                # Determine motor direction based on sign of difference
-                direction1 = CW if difference1 < 0 else CCW
-                direction2 = CW if difference2 < 0 else CCW
-
-                # Calculate steps using PI control
-                steps1, prev_error1, integral1 = pi_control(difference1, prev_error1, integral1)
-                steps2, prev_error2, integral2 = pi_control(difference2, prev_error2, integral2)
-
-                # Execute motor control in threads to allow simultaneous operation
-                threading.Thread(target=motor_control, args=(DIR1, STEP1, direction1, int(steps1))).start()
-                threading.Thread(target=motor_control, args=(DIR2, STEP2, direction2, int(steps2))).start()
-
-            except ValueError:
-                print("Error: Non-integer values received. Check the data format.")
+ldr_smoothing = EMA(alpha, initial=np.zeros(4))
+ldr_decoder = LDRDecoder()
+
+# Blocks in select() until bytes arrive instead of spinning on in_waiting
+ldr_reader = SerialReader(ser)
+for chunk in ldr_reader.chunks():
+    if chunk is None:
+        ldr_decoder.reset()
+        continue
+    ldr_values = ldr_decoder.feed(chunk)
+    if not len(ldr_values):
+        continue
+    # Smooth every pending sample in one pass; control acts on the newest state only
+    smooth_ldr1, smooth_ldr2, smooth_ldr3, smooth_ldr4 = ldr_smoothing.update_batch(ldr_values)[-1]
+
+    # Act at CONTROL_HZ; faster samples only feed the smoothing
+    if not pid1.due():
+        continue
+    # Calculate differences
+    difference1 = smooth_ldr1 - smooth_ldr2
+    difference2 = smooth_ldr3 - smooth_ldr4
+
+    # Calculate steps using PID control
+    steps1 = pid1.update(difference1)
+    steps2 = pid2.update(difference2)
+
+    # Determine motor direction based on sign of the output (the integral can outlast the error)
+    direction1 = CCW if steps1 >= 0 else CW
+    direction2 = CCW if steps2 >= 0 else CW
+
+    # Hand the corrections to the per-axis workers
+    axis1.submit(direction1, int(steps1))
+    axis2.submit(direction2, int(steps2))
+    ldr_reader.actuated()
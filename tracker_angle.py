@@ -2,92 +2,86 @@ import sys
 import threading
 from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout, QPushButton
 from PyQt5.QtCore import Qt, QTimer, QTime
-import RPi.GPIO as GPIO
-from time import sleep
-import serial
-import math
-from BMI160_i2c import Driver
-
-# Serial setup
-try:
-    ser = serial.Serial('/dev/serial0', 115200, timeout=1)
-    print("Serial connection initialized.")
-except serial.SerialException:
-    print("Failed to connect via serial.")
-    sys.exit(1)
-
-# GPIO setup
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sekstant_final'))
+import hardware
+from motion_worker import AxisWorker
+import sensor_fusion
+import numpy as np
+from stream_filters import EMA
+from serial_reader import SerialReader
+from ldr_protocol import LDRDecoder
+from pid import PID
+
+hardware.phase('imports')
+
+# GPIO pins; serial, IMU and stepper backend are opened by the worker threads
 DIR1, STEP1, DIR2, STEP2 = 20, 21, 8, 7
 CW, CCW = 1, 0
-GPIO.setwarnings(False)
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(DIR1, GPIO.OUT)
-GPIO.setup(STEP1, GPIO.OUT)
-GPIO.setup(DIR2, GPIO.OUT)
-GPIO.setup(STEP2, GPIO.OUT)
 
 delay = 0.005
 
-# PI controller constants and variables
-Kp, Ki = 0.05, 0.005
-integral1, integral2 = 0, 0
-prev_error1, prev_error2 = 0, 0
+# One persistent worker per axis; newer corrections replace ones not yet started
+axis1, axis2 = None, None
+
+# PID controller per axis; gains are per second, output is steps per control period
+CONTROL_HZ = 20
+Kp, Ki, Kd = 0.2, 0.02, 0.0
+MAX_STEP = 50
+# Gains measured by autotune.py for this unit replace the defaults above
+pid1 = PID(dt=1 / CONTROL_HZ, **hardware.unit_profile().gains('steps', 1, kp=Kp, ki=Ki, kd=Kd, limit=MAX_STEP))
+pid2 = PID(dt=1 / CONTROL_HZ, **hardware.unit_profile().gains('steps', 2, kp=Kp, ki=Ki, kd=Kd, limit=MAX_STEP))
 smooth_ldr1, smooth_ldr2, smooth_ldr3, smooth_ldr4 = 0, 0, 0, 0
 alpha = 0.1
+ldr_smoothing = EMA(alpha, initial=np.zeros(4))
+ldr_decoder = LDRDecoder()
 
 # Global variables for GUI
 current_imu_angle = 0.0
 max_imu_angle = 0.0
+imu_filter = sensor_fusion.make_filter()  # Gyro+accelerometer fusion (--kalman for the Kalman filter)
 time_of_max_imu_angle = ""
 tracking_active = False
-
-# Initialize the IMU sensor
-sensor = Driver(0x69)
-print('IMU sensor initialization done')
-
-def pi_control(target, prev_error, integral):
-    error = target
-    integral += error
-    output = Kp * error + Ki * integral
-    max_step = 50
-    output = max(-max_step, min(max_step, output))
-    return output, error, integral
-
-def motor_control(motor_dir_pin, motor_step_pin, direction, steps):
-    if tracking_active:
-        GPIO.output(motor_dir_pin, direction)
-        for _ in range(abs(steps)):
-            GPIO.output(motor_step_pin, GPIO.HIGH)
-            sleep(delay)
-            GPIO.output(motor_step_pin, GPIO.LOW)
-            sleep(delay)
+ldr_reader = None
 
 def ldr_thread():
-    global integral1, integral2, prev_error1, prev_error2, smooth_ldr1, smooth_ldr2, smooth_ldr3, smooth_ldr4
-    while True:
-        if tracking_active and ser.in_waiting > 0:
-            line = ser.readline().decode('utf-8').strip()
-            ldr_values = line.split(',')
-            if len(ldr_values) == 4:
-                try:
-                    smooth_ldr1 = smooth_ldr1 * (1 - alpha) + int(ldr_values[0]) * alpha
-                    smooth_ldr2 = smooth_ldr2 * (1 - alpha) + int(ldr_values[1]) * alpha
-                    smooth_ldr3 = smooth_ldr3 * (1 - alpha) + int(ldr_values[2]) * alpha
-                    smooth_ldr4 = smooth_ldr4 * (1 - alpha) + int(ldr_values[3]) * alpha
-
-                    difference1 = smooth_ldr1 - smooth_ldr2
-                    difference2 = smooth_ldr3 - smooth_ldr4
-
-                    direction1 = CW if difference1 < 0 else CCW
-                    direction2 = CW if difference2 < 0 else CCW
-
-                    steps1, prev_error1, integral1 = pi_control(difference1, prev_error1, integral1)
-                    steps2, prev_error2, integral2 = pi_control(difference2, prev_error2, integral2)
-
-                    threading.Thread(target=motor_control, args=(DIR1, STEP1, direction1, int(steps1))).start()
-                    threading.Thread(target=motor_control, args=(DIR2, STEP2, direction2, int(steps2))).start()
-                except ValueError:
-                    print("Error: Non-integer values received. Check the data format.")
+    global smooth_ldr1, smooth_ldr2, smooth_ldr3, smooth_ldr4, axis1, axis2, ldr_reader
+    ser = hardware.serial_port()
+    if ser is None:
+        return
+    stepper = hardware.stepper()
+    axis1 = AxisWorker(stepper, DIR1, STEP1, hardware.unit_profile().step_delay(1, delay), enabled=lambda: tracking_active)
+    axis2 = AxisWorker(stepper, DIR2, STEP2, hardware.unit_profile().step_delay(2, delay), enabled=lambda: tracking_active)
+    # Blocks in select() until bytes arrive or tracking is switched on/off
+    ldr_reader = SerialReader(ser, active=False)
+    # Start pressed while the port was opening found no reader to switch on
+    ldr_reader.set_active(tracking_active)
+    for chunk in ldr_reader.chunks():
+        if chunk is None:
+            ldr_decoder.reset()
+            continue
+        ldr_values = ldr_decoder.feed(chunk)
+        if not len(ldr_values):
+            continue
+        # Smooth the whole backlog in one pass; control acts on the newest state only
+        smooth_ldr1, smooth_ldr2, smooth_ldr3, smooth_ldr4 = ldr_smoothing.update_batch(ldr_values)[-1]
+
+        # Act at CONTROL_HZ; faster samples only feed the smoothing
+        if not pid1.due():
+            continue
+        difference1 = smooth_ldr1 - smooth_ldr2
+        difference2 = smooth_ldr3 - smooth_ldr4
+
+        steps1 = pid1.update(difference1)
+        steps2 = pid2.update(difference2)
+
+        # The integral and derivative can turn the output against the error; step the way the output says
+        direction1 = CCW if steps1 >= 0 else CW
+        direction2 = CCW if steps2 >= 0 else CW
+
+        axis1.submit(direction1, int(steps1))
+        axis2.submit(direction2, int(steps2))
+        ldr_reader.actuated()
 
 class MainWindow(QWidget):
     def __init__(self):
@@ -109,6 +103,9 @@ class MainWindow(QWidget):
         self.maxTimeLabel = QLabel(f'Time of Highest IMU Angle: {time_of_max_imu_angle}')
         self.layout.addWidget(self.maxTimeLabel)
 
+        self.queueLabel = QLabel('Motor queues: idle')
+        self.layout.addWidget(self.queueLabel)
+
         self.startButton = QPushButton('Start Tracking', self)
         self.startButton.clicked.connect(self.start_tracking)
         self.layout.addWidget(self.startButton)
@@ -126,34 +123,58 @@ class MainWindow(QWidget):
     def start_tracking(self):
         global tracking_active
         tracking_active = True
+        pid1.reset()
+        pid2.reset()
+        if ldr_reader is not None:
+            ldr_reader.set_active(True)
 
     def stop_tracking(self):
         global tracking_active
         tracking_active = False
+        if ldr_reader is not None:
+            ldr_reader.set_active(False)
 
     def update_clock(self):
         self.timeLabel.setText("Time: " + QTime.currentTime().toString('HH:mm:ss'))
         self.imuLabel.setText(f'Current IMU Angle: {current_imu_angle:.2f} degrees')
         self.maxImuLabel.setText(f'Highest Recorded IMU Angle: {max_imu_angle:.2f} degrees')
         self.maxTimeLabel.setText(f'Time of Highest IMU Angle: {time_of_max_imu_angle}')
+        if axis1 is None:
+            return
+        s1, s2 = axis1.stats(), axis2.stats()
+        self.queueLabel.setText(f"Motor queues: depth {s1['queue_depth']}/{s2['queue_depth']}, "
+                                f"replaced {s1['replaced'] + s2['replaced']}, merged {s1['merged'] + s2['merged']}, "
+                                f"dropped {s1['dropped'] + s2['dropped']}, "
+                                f"LDR frames lost {ldr_decoder.lost + ldr_decoder.crc_errors}")
+        latency = ldr_reader.stats()['latency_ms_p50'] if ldr_reader is not None else None
+        if latency is not None:
+            self.queueLabel.setText(self.queueLabel.text() + f", LDR latency {latency:.1f} ms")
+        for name, pid in (('axis 1', pid1), ('axis 2', pid2)):
+            stats = pid.stats()
+            settled = f"{stats['settling_time']:.1f} s" if stats['settling_time'] is not None else 'not yet'
+            self.queueLabel.setText(self.queueLabel.text() + f"\n{name}: settled {settled}, "
+                                    f"overshoot {stats['overshoot'] * 100:.0f}%, reversals {stats['reversals']}")
+
+def on_imu_burst(burst):
+    # Runs on the IMU reader thread once per FIFO burst
+    global current_imu_angle, max_imu_angle, time_of_max_imu_angle
+    if not tracking_active:
+        return
+    angles = imu_filter.update_burst(-burst.roll, -burst.roll_rate, burst.dt)  # Inverted roll is the IMU angle
+    current_imu_angle = float(angles[-1])
+    if angles.max() > max_imu_angle:
+        max_imu_angle = float(angles.max())
+        time_of_max_imu_angle = QTime.currentTime().toString('HH:mm:ss')
 
 def update_imu():
-    global current_imu_angle, max_imu_angle, time_of_max_imu_angle
-    while True:
-        if tracking_active:
-            data = sensor.getMotion6()
-            ax, ay, az = data[3], data[4], data[5]
-            roll = math.atan2(ay, az)
-            roll_deg = math.degrees(roll)
-            current_imu_angle = -roll_deg
-            if current_imu_angle > max_imu_angle:
-                max_imu_angle = current_imu_angle
-                time_of_max_imu_angle = QTime.currentTime().toString('HH:mm:ss')
-        sleep(0.5)
+    stream = hardware.imu_stream()
+    print('IMU sensor initialization done')
+    stream.subscribe(on_imu_burst)
 
 app = QApplication(sys.argv)
 window = MainWindow()
 window.show()
+hardware.phase('window')
 
 # Start sensor and LDR threads
 threading.Thread(target=update_imu, daemon=True).start()